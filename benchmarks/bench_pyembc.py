@@ -0,0 +1,413 @@
+"""
+Benchmark suite for pyembc.
+
+Every benchmark is a setup function registered with the @benchmark decorator, that returns the callable
+to be timed. The results are reported as JSON, and can be saved as a baseline and compared against one:
+
+    python -m benchmarks.bench_pyembc --output results.json
+    python -m benchmarks.bench_pyembc --save benchmarks/baseline.json
+    python -m benchmarks.bench_pyembc --compare benchmarks/baseline.json --threshold 2.0
+
+Before comparing, the timings are scaled with the median speed ratio of all the benchmarks, so that
+baselines recorded on a different (faster or slower) machine are still meaningful. This means that the
+comparison catches the benchmarks that got slower relative to the others. The import time is left out of
+the median, and it has its own, tighter threshold, as it is a single, and most visible, number.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from ctypes import c_uint8, c_uint16, c_uint32, c_float
+from typing import Any, Callable, Dict, Optional
+
+from pyembc import pyembc_struct, pyembc_union, parse_records
+from pyembc._pyembc import _compile
+
+try:
+    import construct
+except ImportError:
+    construct = None
+
+# default allowed slowdown factor compared to the baseline
+DEFAULT_THRESHOLD = 2.0
+# default allowed slowdown factor of the import time
+DEFAULT_IMPORT_THRESHOLD = 1.5
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(func):
+    """
+    Registers a benchmark setup function. The name of the benchmark is the name of the function.
+
+    :param func: setup function, that returns the callable to be timed
+    :return: the original function
+    """
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def _make_classes():
+    @pyembc_struct
+    class Inner:
+        a: c_uint8
+        b: c_uint8
+
+    @pyembc_struct
+    class Outer:
+        first: Inner
+        second: c_uint16
+        third: c_float
+
+    @pyembc_struct(endian="big")
+    class Bits:
+        a: (c_uint8, 3)
+        b: (c_uint8, 5)
+        c: (c_uint16, 4)
+        d: (c_uint16, 12)
+
+    @pyembc_union
+    class Union:
+        as_struct: Outer
+        raw: c_uint32
+
+    return Inner, Outer, Bits, Union
+
+
+@benchmark
+def class_creation():
+    def run():
+        # the compiled methods are cached by their code, this times the creation of new layouts
+        _compile.cache_clear()
+        return _make_classes()
+    return run
+
+
+@benchmark
+def construct_empty():
+    _, Outer, _, _ = _make_classes()
+    return Outer
+
+
+@benchmark
+def construct_kwargs():
+    Inner, Outer, _, _ = _make_classes()
+    inner = Inner(a=1, b=2)
+    return lambda: Outer(first=inner, second=3, third=0.5)
+
+
+@benchmark
+def field_set():
+    _, Outer, _, _ = _make_classes()
+    outer = Outer()
+
+    def run():
+        outer.second = 42
+    return run
+
+
+@benchmark
+def field_get():
+    _, Outer, _, _ = _make_classes()
+    outer = Outer()
+    return lambda: outer.second
+
+
+@benchmark
+def parse():
+    _, Outer, _, _ = _make_classes()
+    outer = Outer()
+    data = bytes(range(len(outer)))
+    return lambda: outer.parse(data)
+
+
+@benchmark
+def stream():
+    _, Outer, _, _ = _make_classes()
+    outer = Outer()
+    return outer.stream
+
+
+@benchmark
+def nested_get():
+    _, Outer, _, _ = _make_classes()
+    outer = Outer()
+    return lambda: outer.first.a
+
+
+@benchmark
+def nested_get_records():
+    _, Outer, _, _ = _make_classes()
+    records = parse_records(Outer, bytes(len(Outer()) * 1000))
+
+    def run():
+        # timeit disables the garbage collector, but the collections caused by the record accesses are
+        # part of what is measured here
+        gc.enable()
+        for record in records:
+            record.first.a
+    return run
+
+
+@benchmark
+def nested_get_frames():
+    _, Outer, _, _ = _make_classes()
+    frames = [bytes([i % 256]) * len(Outer()) for i in range(1000)]
+
+    def run():
+        # one instance per received frame, with the garbage collector enabled, like in a receiver loop
+        gc.enable()
+        for frame in frames:
+            Outer.from_buffer_copy(frame).first.a
+    return run
+
+
+@benchmark
+def nested_get_path():
+    _, Outer, _, _ = _make_classes()
+    outer = Outer()
+    return lambda: outer.get("first.a")
+
+
+@benchmark
+def nested_set():
+    Inner, Outer, _, _ = _make_classes()
+    outer = Outer()
+    inner = Inner(a=1, b=2)
+
+    def run():
+        outer.first = inner
+    return run
+
+
+@benchmark
+def bitfield_get():
+    _, _, Bits, _ = _make_classes()
+    bits = Bits(a=1, b=2, c=3, d=4)
+    return lambda: bits.d
+
+
+@benchmark
+def bitfield_set():
+    _, _, Bits, _ = _make_classes()
+    bits = Bits()
+
+    def run():
+        bits.d = 0x123
+    return run
+
+
+@benchmark
+def bitfield_parse():
+    _, _, Bits, _ = _make_classes()
+    bits = Bits()
+    return lambda: bits.parse(b'\x12\x34\x56')
+
+
+@benchmark
+def union_get():
+    _, _, _, Union = _make_classes()
+    union = Union()
+    return lambda: union.as_struct.second
+
+
+@benchmark
+def union_parse():
+    _, _, _, Union = _make_classes()
+    union = Union()
+    data = bytes(range(len(union)))
+    return lambda: union.parse(data)
+
+
+@benchmark
+def repr_nested():
+    _, _, _, Union = _make_classes()
+    union = Union()
+    return lambda: repr(union)
+
+
+@benchmark
+def ccode():
+    _, _, _, Union = _make_classes()
+    return Union.ccode
+
+
+@benchmark
+def roundtrip():
+    @pyembc_struct
+    class SendMode:
+        a: c_uint8
+        b: c_uint8
+
+    @pyembc_struct
+    class NA:
+        send_mode: SendMode
+        enable: c_uint8
+
+    na = NA()
+    data = b'\x01\x02\x03'
+
+    def run():
+        na.parse(data)
+        return na.stream()
+    return run
+
+
+if construct is not None:
+    # the same as roundtrip(), for comparing with the construct library
+    @benchmark
+    def construct_roundtrip():
+        na = construct.Struct(
+            "send_mode" / construct.Struct(
+                "a" / construct.Int8ub,
+                "b" / construct.Int8ub
+            ),
+            "enable" / construct.Int8ub
+        )
+        data = b'\x01\x02\x03'
+        return lambda: na.build(na.parse(data))
+
+
+def _time_import() -> Dict[str, float]:
+    """
+    Times the import of pyembc in a fresh interpreter.
+
+    :return: result entry
+    """
+    code = (
+        "import time; t0 = time.perf_counter(); import pyembc; "
+        "print(time.perf_counter() - t0)"
+    )
+    # the bytecode is written by a first, untimed import, otherwise the timings would include compiling the
+    # sources whenever the bytecode is stale or PYTHONDONTWRITEBYTECODE is set
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    subprocess.run([sys.executable, "-c", "import pyembc"], check=True, env=env)
+    timings = []
+    for _ in range(5):
+        out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True, env=env)
+        timings.append(float(out.stdout))
+    return {"min": min(timings), "number": 1, "repeat": len(timings)}
+
+
+def _time_benchmark(setup: Callable, repeat: int, min_time: float) -> Dict[str, float]:
+    """
+    Times one benchmark.
+
+    :param setup: setup function of the benchmark
+    :param repeat: number of repeats
+    :param min_time: minimum time of one repeat in seconds
+    :return: result entry
+    """
+    timer = timeit.Timer(setup())
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    timings = timer.repeat(repeat=repeat, number=number)
+    return {"min": min(timings) / number, "number": number, "repeat": repeat}
+
+
+def run_benchmarks(
+        names: Optional[list] = None, repeat: int = 7, min_time: float = 0.05, with_import: bool = True
+) -> dict:
+    """
+    Runs the benchmarks.
+
+    :param names: names of the benchmarks to run. Default is all of them.
+    :param repeat: number of repeats
+    :param min_time: minimum time of one repeat in seconds
+    :param with_import: if True, the import time is measured as well
+    :return: machine-readable results
+    """
+    if names is None:
+        names = list(BENCHMARKS)
+    results = {name: _time_benchmark(BENCHMARKS[name], repeat, min_time) for name in names}
+    if with_import:
+        results["import"] = _time_import()
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(
+        results: dict,
+        baseline: dict,
+        threshold: float = DEFAULT_THRESHOLD,
+        import_threshold: float = DEFAULT_IMPORT_THRESHOLD
+) -> Dict[str, float]:
+    """
+    Compares the results to a baseline.
+
+    :param results: results of run_benchmarks()
+    :param baseline: results of a previous run_benchmarks()
+    :param threshold: allowed slowdown factor
+    :param import_threshold: allowed slowdown factor of the import time
+    :return: the regressed benchmarks with their slowdown factors
+    """
+    ratios = {
+        name: result["min"] / baseline["results"][name]["min"]
+        for name, result in results["results"].items() if name in baseline["results"]
+    }
+    if not ratios:
+        return {}
+    # the import time is not taken into account for the machine ratio, so that a slower import cannot hide
+    # itself by shifting the median
+    benchmark_ratios = [ratio for name, ratio in ratios.items() if name != "import"]
+    machine_ratio = statistics.median(benchmark_ratios) if benchmark_ratios else 1.0
+    regressions = {}
+    for name, ratio in ratios.items():
+        limit = import_threshold if name == "import" else threshold
+        if ratio / machine_ratio > limit:
+            regressions[name] = ratio / machine_ratio
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="pyembc benchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, default is all")
+    parser.add_argument("--output", help="write the results to this JSON file instead of the stdout")
+    parser.add_argument("--save", help="save the results as a baseline to this JSON file")
+    parser.add_argument("--compare", help="compare the results to this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown factor")
+    parser.add_argument(
+        "--import-threshold", type=float, default=DEFAULT_IMPORT_THRESHOLD,
+        help="allowed slowdown factor of the import time"
+    )
+    parser.add_argument("--repeat", type=int, default=7, help="number of repeats")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names or None, repeat=args.repeat, with_import=not args.names)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    elif not args.save:
+        print(text)
+    if args.save:
+        with open(args.save, "w") as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.import_threshold)
+        for name, factor in regressions.items():
+            print(f"REGRESSION: {name} is {factor:.2f}x slower than the baseline", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,17 @@
 from ._pyembc import *
+from ._stats import *
+from ._bitfields import *
+from ._cheader import *
+from ._checksum import *
+from ._migration import *
+from ._records import *
 
 __all__ = [
-    *_pyembc.__all__
+    *_pyembc.__all__,
+    *_stats.__all__,
+    *_bitfields.__all__,
+    *_cheader.__all__,
+    *_checksum.__all__,
+    *_migration.__all__,
+    *_records.__all__
 ]
@@ -0,0 +1,171 @@
+import ctypes
+from typing import Dict, Iterable, Optional, Mapping, Any
+
+from . import _pyembc
+from ._pyembc import _FIELDS, _ENDIAN, _is_pyembc_type
+
+__all__ = [
+    "BitfieldInfo",
+    "bitfield_layout",
+    "decode_bitfields",
+    "encode_bitfields"
+]
+
+
+class BitfieldInfo:
+
+    """
+    Class for holding the layout of a bitfield in a record
+    """
+
+    def __init__(self, base_type, offset: int, endian: str, bit_size: int, shift: int):
+        self.base_type = base_type
+        self.offset = offset
+        self.size = ctypes.sizeof(base_type)
+        self.endian = endian
+        self.bit_size = bit_size
+        self.shift = shift
+        self.signed = base_type._type_.islower()
+
+    @property
+    def mask(self) -> int:
+        """
+        Mask of the bitfield value, after shifting it down
+        """
+        return (1 << self.bit_size) - 1
+
+    @property
+    def unit_mask(self) -> int:
+        """
+        Mask of the bitfield in its storage unit
+        """
+        return self.mask << self.shift
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(offset={self.offset}, size={self.size}, endian={self.endian}, "
+            f"shift={self.shift}, mask=0x{self.mask:X})"
+        )
+
+
+def bitfield_layout(cls, _prefix: str = "", _offset: int = 0) -> Dict[str, BitfieldInfo]:
+    """
+    Returns the layout of the bitfields of a pyembc class, including the bitfields of the nested
+    structures/unions.
+
+    :param cls: pyembc class
+    :return: dict of the dotted path of the bitfields and their layouts
+    """
+    layout = {}
+    endian = getattr(cls, _ENDIAN)
+    for field_name, field_type in getattr(cls, _FIELDS).items():
+        if _is_pyembc_type(field_type):
+            layout.update(
+                bitfield_layout(field_type.base_type, f"{_prefix}{field_name}.", _offset + field_type.offset)
+            )
+        elif field_type.is_bitfield:
+            layout[f"{_prefix}{field_name}"] = BitfieldInfo(
+                base_type=field_type.base_type,
+                offset=_offset + field_type.offset,
+                endian=endian,
+                bit_size=field_type.bit_size,
+                shift=field_type.bit_shift
+            )
+    return layout
+
+
+def _get_numpy():
+    np = _pyembc._get_numpy()
+    if np is None:
+        raise ImportError("numpy is required for the batch bitfield operations!")
+    return np
+
+
+def _unit_words(np, buffer, count: int, record_size: int, info: BitfieldInfo):
+    """
+    Creates a strided view of the storage units of a bitfield in all the records, without copying.
+
+    :param np: numpy module
+    :param buffer: records
+    :param count: number of records
+    :param record_size: size of one record
+    :param info: layout of the bitfield
+    :return: numpy array view
+    """
+    byteorder = "<" if info.endian == "little" else ">"
+    dtype = np.dtype(f"{byteorder}u{info.size}")
+    return np.ndarray((count,), dtype=dtype, buffer=buffer, offset=info.offset, strides=(record_size,))
+
+
+def _record_count(np, cls, data) -> int:
+    record_size = ctypes.sizeof(cls)
+    nbytes = np.frombuffer(data, dtype=np.uint8).size
+    if nbytes % record_size:
+        raise ValueError(f"Buffer length {nbytes} is not a multiple of the record size {record_size}!")
+    return nbytes // record_size
+
+
+def decode_bitfields(cls, data, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Decodes the bitfields of many records at once.
+
+    :param cls: pyembc class of the records
+    :param data: bytes-like object holding the records one after another
+    :param fields: dotted paths of the bitfields to decode. Default is all of them.
+    :return: dict of the dotted paths and numpy arrays of the values
+    """
+    np = _get_numpy()
+    layout = bitfield_layout(cls)
+    if fields is None:
+        fields = layout
+    count = _record_count(np, cls, data)
+    record_size = ctypes.sizeof(cls)
+    words_cache = {}
+    columns = {}
+    for path in fields:
+        info = layout[path]
+        key = (info.offset, info.size, info.endian)
+        words = words_cache.get(key)
+        if words is None:
+            words = words_cache[key] = _unit_words(np, data, count, record_size, info)
+        values = (words >> info.shift) & info.mask
+        if info.signed:
+            sign = 1 << (info.bit_size - 1)
+            values = (values.astype(np.int64) ^ sign) - sign
+        columns[path] = values.astype(np.dtype(info.base_type))
+    return columns
+
+
+def encode_bitfields(cls, columns: Mapping[str, Any], data=None):
+    """
+    Encodes columns of bitfield values into many records at once.
+
+    :param cls: pyembc class of the records
+    :param columns: dict of the dotted paths of the bitfields and the values (sequences/numpy arrays)
+    :param data: writable bytes-like object (e.g. bytearray) holding the records. It is updated in place,
+        the other fields are left untouched. If not given, a zeroed bytearray is created.
+    :return: the updated records
+    :raises: ValueError if a value does not fit its bitfield
+    """
+    np = _get_numpy()
+    layout = bitfield_layout(cls)
+    record_size = ctypes.sizeof(cls)
+    if data is None:
+        count = len(next(iter(columns.values()))) if columns else 0
+        data = bytearray(count * record_size)
+    count = _record_count(np, cls, data)
+    for path, values in columns.items():
+        info = layout[path]
+        values = np.asarray(values, dtype=np.int64)
+        if len(values) != count:
+            raise ValueError(f"Column {path} has {len(values)} values instead of {count}!")
+        if info.signed:
+            min_raw, max_raw = -(1 << (info.bit_size - 1)), (1 << (info.bit_size - 1)) - 1
+        else:
+            min_raw, max_raw = 0, info.mask
+        if count and (values.min() < min_raw or values.max() > max_raw):
+            raise ValueError(f"Cannot set values out of [{min_raw}, {max_raw}] for bitfield {path}")
+        words = _unit_words(np, data, count, record_size, info)
+        raw = (values.astype(words.dtype) & info.mask) << info.shift
+        words[:] = (words & ~np.array(info.unit_mask, dtype=words.dtype)) | raw
+    return data
@@ -0,0 +1,428 @@
+import os
+import re
+import sys
+import json
+import ctypes
+import threading
+from typing import Dict, List, Optional, Tuple, Union, Iterable, Iterator, Mapping
+
+from ._pyembc import pyembc_struct, pyembc_union
+
+__all__ = [
+    "parse_cheader",
+    "load_cheader"
+]
+
+# ctypes types for the canonical names of the basic c types
+_BASIC_TYPES = {
+    "int8": ctypes.c_int8,
+    "uint8": ctypes.c_uint8,
+    "int16": ctypes.c_int16,
+    "uint16": ctypes.c_uint16,
+    "int32": ctypes.c_int32,
+    "uint32": ctypes.c_uint32,
+    "int64": ctypes.c_int64,
+    "uint64": ctypes.c_uint64,
+    "float": ctypes.c_float,
+    "double": ctypes.c_double,
+}
+# canonical names of the basic c types, keyed by their sorted keywords. Note, that "long" is 8 bytes here,
+# to be consistent with ccode(). For 4 byte longs, see _LONG_TYPES_32.
+_C_TYPE_NAMES = {
+    ("char",): "int8",
+    ("char", "signed"): "int8",
+    ("char", "unsigned"): "uint8",
+    ("short",): "int16",
+    ("int", "short"): "int16",
+    ("short", "signed"): "int16",
+    ("int", "short", "signed"): "int16",
+    ("short", "unsigned"): "uint16",
+    ("int", "short", "unsigned"): "uint16",
+    ("int",): "int32",
+    ("signed",): "int32",
+    ("int", "signed"): "int32",
+    ("unsigned",): "uint32",
+    ("int", "unsigned"): "uint32",
+    ("long",): "int64",
+    ("int", "long"): "int64",
+    ("long", "signed"): "int64",
+    ("int", "long", "signed"): "int64",
+    ("long", "unsigned"): "uint64",
+    ("int", "long", "unsigned"): "uint64",
+    ("long", "long"): "int64",
+    ("int", "long", "long"): "int64",
+    ("long", "long", "signed"): "int64",
+    ("int", "long", "long", "signed"): "int64",
+    ("long", "long", "unsigned"): "uint64",
+    ("int", "long", "long", "unsigned"): "uint64",
+    ("float",): "float",
+    ("double",): "double",
+}
+# canonical names of the (non "long long") long types, when long is 4 bytes
+_LONG_TYPES_32 = {"int64": "int32", "uint64": "uint32"}
+_C_TYPE_KEYWORDS = {"char", "short", "int", "long", "signed", "unsigned", "float", "double"}
+_C_QUALIFIERS = {"const", "volatile"}
+# the stdint.h types
+_STDINT_TYPES = {
+    f"{prefix}int{bits}_t": f"{prefix}int{bits}" for prefix in ("", "u") for bits in (8, 16, 32, 64)
+}
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<pragma>^[ \t]*\#[ \t]*pragma[ \t]+pack[ \t]*\((?P<pack>[^)]*)\)[^\n]*$)
+    | (?P<directive>^[ \t]*\#(?:[^\n]*\\\n)*[^\n]*$)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<number>0[xX][0-9a-fA-F]+|\d+)
+    | (?P<punct>[{};:,*\[\]=()])
+    | (?P<newline>\n)
+    | (?P<space>[ \t\r\f\v]+)
+    | (?P<error>.)
+    """,
+    re.MULTILINE | re.VERBOSE
+)
+_COMMENT_RE = re.compile(r"/\*.*?\*/|//[^\n]*", re.DOTALL)
+
+# cache of the generated classes, keyed by the header hash and the parameters
+_class_cache: Dict[Tuple[str, str, int, int], Mapping[str, type]] = {}
+
+
+class _HeaderParser:
+
+    """
+    Parser for the typedef/struct/union/bitfield subset of c, that ccode() generates, plus #pragma pack.
+    The result is a JSON serializable list of type specifications, in definition order:
+        {"name": ..., "kind": "struct"/"union", "pack": ..., "fields": [[name, type, bit size or None], ...]}
+    where type is either a canonical basic type name, or the name of a previously defined type.
+    """
+
+    def __init__(self, text: str, pack: int, long_size: int = 8):
+        self.default_pack = pack
+        self.long_size = long_size
+        self.pack = pack
+        self.pack_stack = []
+        self.tokens = []
+        self.pos = 0
+        # typedef names and struct/union tags mapped to canonical basic type names or spec names
+        self.typedefs = dict(_STDINT_TYPES)
+        self.tags = {}
+        self.specs = []
+        self.defined = {}
+        self._tokenize(_COMMENT_RE.sub(lambda m: "\n" * m.group().count("\n") or " ", text))
+
+    def _tokenize(self, text: str):
+        line = 1
+        for m in _TOKEN_RE.finditer(text):
+            kind = m.lastgroup
+            if kind == "pack":
+                kind = "pragma"
+            if kind == "pragma":
+                self.tokens.append(("pragma", m.group("pack"), line))
+            elif kind in ("name", "number", "punct"):
+                self.tokens.append((kind, m.group(), line))
+            elif kind == "error":
+                raise SyntaxError(f"line {line}: unexpected character {m.group()!r}")
+            line += m.group().count("\n")
+
+    def _error(self, message: str):
+        line = self.tokens[min(self.pos, len(self.tokens) - 1)][2] if self.tokens else 1
+        raise SyntaxError(f"line {line}: {message}")
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        if self.pos >= len(self.tokens):
+            self._error("unexpected end of header")
+        value = self.tokens[self.pos][1]
+        self.pos += 1
+        return value
+
+    def _expect(self, value: str):
+        if self._next() != value:
+            self.pos -= 1
+            self._error(f"expected {value!r}, got {self._peek()!r}")
+
+    def _name(self) -> str:
+        if self.pos >= len(self.tokens) or self.tokens[self.pos][0] != "name":
+            self._error(f"expected a name, got {self._peek()!r}")
+        return self._next()
+
+    def _pragma_pack(self, args: str):
+        args = [arg.strip() for arg in args.split(",") if arg.strip()]
+        if not args:
+            self.pack = self.default_pack
+        elif args[0] == "push":
+            self.pack_stack.append(self.pack)
+            if len(args) > 1:
+                self.pack = int(args[1], 0)
+        elif args[0] == "pop":
+            self.pack = self.pack_stack.pop() if self.pack_stack else self.default_pack
+        else:
+            self.pack = int(args[0], 0)
+
+    def parse(self) -> List[dict]:
+        while self.pos < len(self.tokens):
+            kind, value, _ = self.tokens[self.pos]
+            if kind == "pragma":
+                self.pos += 1
+                self._pragma_pack(value)
+            elif value == "typedef":
+                self.pos += 1
+                self._typedef()
+            elif value in ("struct", "union"):
+                self._record(typedef_name=None)
+                self._expect(";")
+            else:
+                self._error(f"unsupported declaration starting with {value!r}")
+        return self.specs
+
+    def _typedef(self):
+        if self._peek() in ("struct", "union"):
+            name = self._record(typedef_name=self._typedef_name_after_body())
+        else:
+            name = self._type_name()
+        alias = self._name()
+        self.typedefs[alias] = name
+        if name in self.defined and alias != name:
+            self.specs.append({"name": alias, "kind": "alias", "type": name})
+        self._expect(";")
+
+    def _typedef_name_after_body(self) -> Optional[str]:
+        """
+        Looks ahead for the name of a typedef struct/union, that follows its body
+        """
+        depth = 0
+        for i in range(self.pos, len(self.tokens)):
+            value = self.tokens[i][1]
+            if value == "{":
+                depth += 1
+            elif value == "}":
+                depth -= 1
+                if depth == 0:
+                    if i + 1 < len(self.tokens) and self.tokens[i + 1][0] == "name":
+                        return self.tokens[i + 1][1]
+                    return None
+            elif value == ";" and depth == 0:
+                return None
+        return None
+
+    def _record(self, typedef_name: Optional[str]) -> str:
+        """
+        Parses a struct/union definition or reference
+
+        :param typedef_name: the typedef name of the definition, if any
+        :return: name of the referenced/defined type
+        """
+        kind = self._next()
+        tag = self._name() if self._peek() != "{" else None
+        if self._peek() != "{":
+            # reference to a previously defined struct/union
+            try:
+                return self.tags[(kind, tag)]
+            except KeyError:
+                self._error(f"unknown {kind} {tag}")
+        name = typedef_name or tag
+        if name is None:
+            self._error(f"anonymous {kind} without typedef name")
+        self._expect("{")
+        fields = []
+        while self._peek() != "}":
+            fields.append(self._member())
+        self._expect("}")
+        if not fields:
+            self._error(f"empty {kind} {name}")
+        spec = {"name": name, "kind": kind, "pack": self.pack, "fields": fields}
+        if name in self.defined:
+            # ccode() repeats the definitions of the nested types, identical redefinitions are accepted
+            if self.defined[name] != spec:
+                self._error(f"conflicting definitions for {name}")
+        else:
+            self.defined[name] = spec
+            self.specs.append(spec)
+        if tag is not None:
+            self.tags[(kind, tag)] = name
+        return name
+
+    def _type_name(self) -> str:
+        """
+        Parses a type specifier, and returns its canonical basic name or the name of the referenced type
+        """
+        while self._peek() in _C_QUALIFIERS:
+            self.pos += 1
+        if self._peek() in ("struct", "union"):
+            return self._record(typedef_name=None)
+        keywords = []
+        while self._peek() in _C_TYPE_KEYWORDS or self._peek() in _C_QUALIFIERS:
+            value = self._next()
+            if value not in _C_QUALIFIERS:
+                keywords.append(value)
+        if keywords:
+            try:
+                type_name = _C_TYPE_NAMES[tuple(sorted(keywords))]
+            except KeyError:
+                self._error(f"unsupported type {' '.join(keywords)}")
+            if self.long_size == 4 and keywords.count("long") == 1:
+                type_name = _LONG_TYPES_32[type_name]
+            return type_name
+        name = self._name()
+        try:
+            return self.typedefs[name]
+        except KeyError:
+            self.pos -= 1
+            self._error(f"unknown type {name}")
+
+    def _member(self) -> list:
+        type_name = self._type_name()
+        while self._peek() in _C_QUALIFIERS:
+            self.pos += 1
+        if self._peek() in ("*", "["):
+            self._error("pointers and arrays are not supported")
+        field_name = self._name()
+        bit_size = None
+        if self._peek() == ":":
+            self.pos += 1
+            if type_name not in _BASIC_TYPES:
+                self._error(f"bitfield {field_name} must be of a basic type")
+            bit_size = int(self._next(), 0)
+        if self._peek() in ("[", ","):
+            self._error("arrays and multiple declarators are not supported")
+        self._expect(";")
+        return [field_name, type_name, bit_size]
+
+
+def _header_hash(text: str, pack: int, long_size: int) -> str:
+    # hashlib is imported here, as it is slow to import, and only the cached header imports need it
+    import hashlib
+    return hashlib.sha256(f"{pack}\n{long_size}\n{text}".encode()).hexdigest()
+
+
+def _parse_specs(text: str, pack: int, long_size: int, cache_dir: Optional[str]) -> List[dict]:
+    """
+    Parses the type specifications from a header, using the on-disk cache if given.
+
+    :param text: header text
+    :param pack: default packing
+    :param long_size: byte size of long
+    :param cache_dir: directory of the on-disk cache
+    :return: type specifications
+    """
+    if cache_dir is None:
+        return _HeaderParser(text, pack, long_size).parse()
+    path = os.path.join(cache_dir, f"{_header_hash(text, pack, long_size)}.json")
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    specs = _HeaderParser(text, pack, long_size).parse()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(specs, f)
+    os.replace(tmp_path, path)
+    return specs
+
+
+class _LazyClasses(Mapping):
+
+    """
+    Read-only mapping of the type names to the pyembc classes. The classes are generated on first access,
+    as generating the classes of a big header would take much longer than parsing it.
+    """
+
+    def __init__(self, specs: List[dict], endian: str):
+        self._specs = {spec["name"]: spec for spec in specs}
+        self._endian = endian
+        self._classes = {}
+        # the classes are generated under a lock, so that concurrent first accesses end up with the same
+        # classes, including the nested ones. Reentrant, as the nested classes are generated recursively.
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name: str) -> type:
+        cls = self._classes.get(name)
+        if cls is not None:
+            return cls
+        spec = self._specs[name]
+        with self._lock:
+            cls = self._classes.get(name)
+            if cls is not None:
+                return cls
+            if spec["kind"] == "alias":
+                cls = self[spec["type"]]
+            else:
+                annotations = {}
+                for field_name, type_name, bit_size in spec["fields"]:
+                    field_type = _BASIC_TYPES.get(type_name) or self[type_name]
+                    annotations[field_name] = field_type if bit_size is None else (field_type, bit_size)
+                cls = type(spec["name"], (), {"__annotations__": annotations})
+                if spec["kind"] == "struct":
+                    cls = pyembc_struct(cls, endian=self._endian, pack=spec["pack"])
+                else:
+                    cls = pyembc_union(cls)
+            self._classes[name] = cls
+        return cls
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self._specs)})"
+
+
+def parse_cheader(
+        text: str, *, endian: str = sys.byteorder, pack: int = 4, long_size: int = 8,
+        cache_dir: Optional[str] = None
+) -> Mapping[str, type]:
+    """
+    Generates pyembc classes from the typedef/struct/union/bitfield definitions of a c header.
+    The supported subset is what ccode() generates, plus #pragma pack, typedefs of basic types and
+    the stdint.h types. Other preprocessor directives are ignored.
+
+    The results are cached by the hash of the header, in memory, and optionally on the disk as well.
+    The classes are generated lazily, on first access.
+
+    :param text: header text
+    :param endian: endianness of the structures. "little" or "big". Unions are always native.
+    :param pack: packing of the structures, where no #pragma pack is in effect
+    :param long_size: byte size of long on the target: 8 (default, like ccode()), or 4, e.g. for 32 bit
+        targets and Windows
+    :param cache_dir: directory for caching the parsed definitions between runs
+    :return: mapping of the typedef names to the generated classes
+    :raises: SyntaxError for unsupported or invalid definitions, ValueError for an invalid long_size
+    """
+    if long_size not in (4, 8):
+        raise ValueError(f"Invalid long size: {long_size}. Must be 4 or 8.")
+    key = (_header_hash(text, pack, long_size), endian, pack, long_size)
+    classes = _class_cache.get(key)
+    if classes is None:
+        classes = _class_cache.setdefault(
+            key, _LazyClasses(_parse_specs(text, pack, long_size, cache_dir), endian)
+        )
+    return classes
+
+
+def load_cheader(
+        paths: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]], *,
+        endian: str = sys.byteorder, pack: int = 4, long_size: int = 8, cache_dir: Optional[str] = None
+) -> Mapping[str, type]:
+    """
+    Generates pyembc classes from c header files. Multiple headers are processed in the given order,
+    as if they were included one after another. See parse_cheader() for details.
+
+    :param paths: path of the header, or paths of the headers
+    :param endian: endianness of the structures. "little" or "big"
+    :param pack: packing of the structures, where no #pragma pack is in effect
+    :param long_size: byte size of long on the target, 4 or 8
+    :param cache_dir: directory for caching the parsed definitions between runs
+    :return: mapping of the typedef names to the generated classes
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    texts = []
+    for path in paths:
+        with open(path, "r") as f:
+            texts.append(f.read())
+    return parse_cheader("\n".join(texts), endian=endian, pack=pack, long_size=long_size, cache_dir=cache_dir)
@@ -0,0 +1,167 @@
+import zlib
+import ctypes
+import struct
+import binascii
+from typing import Callable, Union, List
+
+__all__ = [
+    "Checksum",
+    "verify_checksums"
+]
+
+# name for holding the compiled checksum computations of a class
+_CHECKSUMS = "__pyembc_checksums__"
+
+
+def _sum(bits: int) -> Callable[[memoryview], int]:
+    mask = (1 << bits) - 1
+
+    def checksum(data: memoryview) -> int:
+        return sum(data) & mask
+    return checksum
+
+
+def _xor8(data: memoryview) -> int:
+    result = 0
+    for byte in data:
+        result ^= byte
+    return result
+
+
+def _crc16_ccitt(data: memoryview) -> int:
+    # CRC-16/CCITT-FALSE: poly 0x1021, init 0xFFFF
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def _make_crc16_modbus_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC16_MODBUS_TABLE = _make_crc16_modbus_table()
+
+
+def _crc16_modbus(data: memoryview) -> int:
+    # CRC-16/MODBUS: reflected poly 0xA001, init 0xFFFF
+    crc = 0xFFFF
+    table = _CRC16_MODBUS_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _crc32(data: memoryview) -> int:
+    return zlib.crc32(data)
+
+
+# the built-in checksum algorithms. All of them get a memoryview of the covered bytes.
+_ALGORITHMS = {
+    "sum8": _sum(8),
+    "sum16": _sum(16),
+    "sum32": _sum(32),
+    "xor8": _xor8,
+    "crc16": _crc16_ccitt,
+    "crc16-ccitt": _crc16_ccitt,
+    "crc16-modbus": _crc16_modbus,
+    "crc32": _crc32,
+}
+
+
+class Checksum:
+
+    """
+    Annotation for checksum fields. The checksum is computed over the bytes of the containing
+    structure from the start offset up to the checksum field. stream() fills it in, and parse()
+    verifies it.
+
+    Usage:
+
+        @pyembc_struct(pack=1)
+        class Frame:
+            id: c_uint8
+            payload: c_uint32
+            crc: Checksum(c_uint16, "crc16")
+    """
+
+    def __init__(self, base_type, algorithm: Union[str, Callable[[memoryview], int]] = "crc16", start: int = 0):
+        """
+        :param base_type: ctypes type of the checksum field
+        :param algorithm: name of a built-in algorithm (sum8, sum16, sum32, xor8, crc16 (CCITT-FALSE),
+            crc16-ccitt, crc16-modbus, crc32), or a callable that gets a memoryview of the covered bytes
+            and returns the checksum.
+        :param start: byte offset of the first covered byte in the structure
+        """
+        if callable(algorithm):
+            self.func = algorithm
+        else:
+            try:
+                self.func = _ALGORITHMS[algorithm]
+            except KeyError:
+                raise ValueError(f"Unknown checksum algorithm: {algorithm}") from None
+        self.base_type = base_type
+        self.algorithm = algorithm
+        self.start = start
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.base_type.__name__}, {self.algorithm!r}, start={self.start})"
+
+
+class _ChecksumField:
+
+    """
+    Compiled computation of a checksum field, with absolute offsets in the outermost structure
+    """
+
+    def __init__(self, name: str, offset: int, start: int, func: Callable, fmt: str, size: int):
+        self.name = name
+        self.offset = offset
+        self.start = start
+        self.func = func
+        self.struct = struct.Struct(fmt)
+        self.mask = (1 << (size * 8)) - 1
+
+    def shifted(self, prefix: str, delta: int) -> "_ChecksumField":
+        """
+        Creates a copy for a containing structure, where the containing structure is at the given offset
+
+        :param prefix: dotted path prefix of the name
+        :param delta: offset of the nested structure in the containing structure
+        :return: new instance
+        """
+        return _ChecksumField(
+            f"{prefix}{self.name}", self.offset + delta, self.start + delta, self.func, self.struct.format,
+            self.struct.size
+        )
+
+    def compute(self, buffer: memoryview, base: int = 0) -> int:
+        return self.func(buffer[base + self.start:base + self.offset]) & self.mask
+
+    def update(self, buffer: memoryview, base: int = 0):
+        self.struct.pack_into(buffer, base + self.offset, self.compute(buffer, base))
+
+    def verify(self, buffer: memoryview, base: int = 0) -> bool:
+        return self.compute(buffer, base) == self.struct.unpack_from(buffer, base + self.offset)[0]
+
+
+def verify_checksums(cls, data) -> List[bool]:
+    """
+    Verifies the checksums of many records at once, without creating instances or copying the data.
+
+    :param cls: pyembc class of the records
+    :param data: bytes-like object holding the records one after another
+    :return: list of the verification results of the records
+    """
+    checksums = getattr(cls, _CHECKSUMS)
+    buffer = memoryview(data).cast("B")
+    record_size = ctypes.sizeof(cls)
+    if len(buffer) % record_size:
+        raise ValueError(f"Buffer length {len(buffer)} is not a multiple of the record size {record_size}!")
+    return [
+        all(checksum.verify(buffer, base) for checksum in checksums)
+        for base in range(0, len(buffer), record_size)
+    ]
@@ -0,0 +1,354 @@
+import ctypes
+import operator
+import threading
+from typing import Dict, List, Tuple, Any
+
+from . import _pyembc
+from ._pyembc import (
+    _FIELDS, _ENDIAN, _EVOLVES_FROM, _CTYPES_TYPE_ATTR, _is_pyembc_type, _compile_getter, _set_field
+)
+from ._checksum import _CHECKSUMS
+from ._bitfields import decode_bitfields, encode_bitfields
+
+__all__ = [
+    "migrate",
+    "migrate_records"
+]
+
+# compiled migrations, keyed by (old class, new class)
+_migrations: Dict[Tuple[type, type], "_Migration"] = {}
+_migrations_lock = threading.Lock()
+
+
+def _flatten(cls, prefix: str = "", offset: int = 0) -> Dict[str, Tuple[Any, int, str]]:
+    """
+    Flattens the fields of a structure. Nested structures are walked recursively, nested unions are
+    handled as one opaque field, as their members overlap.
+
+    :param cls: pyembc class
+    :param prefix: prefix of the dotted path, used for the recursion
+    :param offset: offset of cls in the outermost structure, used for the recursion
+    :return: dict of the dotted paths and (field type, absolute offset, endianness of the owner)
+    """
+    flat = {}
+    for field_name, field_type in getattr(cls, _FIELDS).items():
+        path = f"{prefix}{field_name}"
+        if _is_pyembc_type(field_type) and field_type.is_structure:
+            flat.update(_flatten(field_type.base_type, f"{path}.", offset + field_type.offset))
+        else:
+            flat[path] = (field_type, offset + field_type.offset, getattr(cls, _ENDIAN))
+    return flat
+
+
+def _layout_key(cls) -> tuple:
+    """
+    Returns a comparable description of the memory layout of a pyembc class.
+
+    :param cls: pyembc class
+    :return: layout description
+    """
+    fields = []
+    for field_name, field_type in getattr(cls, _FIELDS).items():
+        if _is_pyembc_type(field_type):
+            fields.append((field_name, field_type.offset, _layout_key(field_type.base_type)))
+        else:
+            fields.append((
+                field_name, field_type.offset, getattr(field_type.base_type, _CTYPES_TYPE_ATTR, None),
+                ctypes.sizeof(field_type.base_type), field_type.bit_size, field_type.bit_shift
+            ))
+    return ctypes.sizeof(cls), getattr(cls, _ENDIAN), issubclass(cls, ctypes.Union), tuple(fields)
+
+
+def _is_byte_compatible(old: Tuple[Any, int, str], new: Tuple[Any, int, str]) -> bool:
+    """
+    Checks whether a field can be migrated by copying its bytes
+
+    :param old: flattened old field
+    :param new: flattened new field
+    :return: True if the bytes can be copied
+    """
+    old_type, _, old_endian = old
+    new_type, _, new_endian = new
+    if old_type.is_bitfield or new_type.is_bitfield:
+        return False
+    size = ctypes.sizeof(old_type.base_type)
+    if size != ctypes.sizeof(new_type.base_type):
+        return False
+    if _is_pyembc_type(old_type) or _is_pyembc_type(new_type):
+        # opaque unions
+        if not (_is_pyembc_type(old_type) and _is_pyembc_type(new_type)):
+            return False
+        return _layout_key(old_type.base_type) == _layout_key(new_type.base_type)
+    if not (old_type.is_ctypes_simple_type and new_type.is_ctypes_simple_type):
+        return False
+    same_char = getattr(old_type.base_type, _CTYPES_TYPE_ATTR) == getattr(new_type.base_type, _CTYPES_TYPE_ATTR)
+    return same_char and (size == 1 or old_endian == new_endian)
+
+
+def _is_float_to_int(old: Tuple[Any, int, str], new: Tuple[Any, int, str]) -> bool:
+    """
+    Checks whether a conversion is from a floating point field to an integer (or bitfield) field
+
+    :param old: flattened old field
+    :param new: flattened new field
+    :return: True for float to int conversions
+    """
+    old_char = getattr(old[0].base_type, _CTYPES_TYPE_ATTR)
+    new_char = getattr(new[0].base_type, _CTYPES_TYPE_ATTR)
+    return old_char in "fd" and new_char not in "fd"
+
+
+def _integral_getter(path: str, getter):
+    """
+    Wraps the getter of a float field, that is converted to an integer field. Only the integral values
+    are converted, the others would be silently changed by the conversion.
+
+    :param path: dotted path
+    :param getter: getter of the float field
+    :return: getter returning ints
+    :raises: ValueError for non-integral and non-finite values
+    """
+    def integral_getter(instance):
+        value = getter(instance)
+        if not value.is_integer():
+            raise ValueError(f"Value {value} of field {path} is not an integer!")
+        return int(value)
+    return integral_getter
+
+
+def _setter(path: str):
+    """
+    Creates a setter for a dotted path, that goes through the generated setter with its value checks.
+    Frozen instances are set as well, as they are under construction here.
+
+    :param path: dotted path
+    :return: setter function, that gets an instance and the value
+    """
+    parent_path, _, name = path.rpartition(".")
+    if not parent_path:
+        return lambda instance, value: _set_field(instance, name, value)
+    get_parent = operator.attrgetter(parent_path)
+    return lambda instance, value: _set_field(get_parent(instance), name, value)
+
+
+class _Migration:
+
+    """
+    Compiled conversion between two layout revisions of a structure. The fields are matched by their
+    dotted paths. The byte-compatible fields are copied with one memmove per contiguous run of bytes,
+    the others (widened types, changed endianness, bitfields) are converted by value. The fields that
+    are missing from the old revision are left zeroed.
+    """
+
+    def __init__(self, old_cls, new_cls):
+        self.old_cls = old_cls
+        self.new_cls = new_cls
+        self.old_size = ctypes.sizeof(old_cls)
+        self.new_size = ctypes.sizeof(new_cls)
+        # (old offset, new offset, size) of the contiguous runs of bytes
+        self.runs: List[Tuple[int, int, int]] = []
+        # (dotted path, old field, new field) of the fields converted by value
+        self.conversions = []
+        self.getters = []
+        self.setters = []
+        self.checksums = getattr(new_cls, _CHECKSUMS, ())
+        if issubclass(old_cls, ctypes.Union) or issubclass(new_cls, ctypes.Union):
+            if _layout_key(old_cls) != _layout_key(new_cls):
+                raise TypeError("Unions can only be migrated if their layout is unchanged!")
+            self.runs.append((0, 0, self.old_size))
+            return
+        old_flat = _flatten(old_cls)
+        new_flat = _flatten(new_cls)
+        copies = []
+        for path, new in new_flat.items():
+            old = old_flat.get(path)
+            if old is None:
+                continue
+            if _is_byte_compatible(old, new):
+                copies.append((old[1], new[1], ctypes.sizeof(old[0].base_type)))
+            elif _is_pyembc_type(old[0]) or _is_pyembc_type(new[0]):
+                raise TypeError(f"Field {path} cannot be migrated: union layout or field kind changed!")
+            elif not (old[0].is_ctypes_simple_type and new[0].is_ctypes_simple_type):
+                raise TypeError(f"Field {path} cannot be migrated: only ctypes simple types can be converted!")
+            else:
+                self.conversions.append((path, old, new))
+        # merge the copies into contiguous runs
+        for old_offset, new_offset, size in sorted(copies):
+            if self.runs:
+                last_old, last_new, last_size = self.runs[-1]
+                if last_old + last_size == old_offset and last_new + last_size == new_offset:
+                    self.runs[-1] = (last_old, last_new, last_size + size)
+                    continue
+            self.runs.append((old_offset, new_offset, size))
+        self.getters = [
+            _integral_getter(path, _compile_getter(old_cls, path)) if _is_float_to_int(old, new)
+            else _compile_getter(old_cls, path)
+            for path, old, new in self.conversions
+        ]
+        self.setters = [_setter(path) for path, _, _ in self.conversions]
+
+    def convert(self, old):
+        """
+        Converts one instance
+
+        :param old: instance of the old class
+        :return: instance of the new class
+        """
+        if not isinstance(old, self.old_cls):
+            raise TypeError(f"{self.old_cls.__name__} instance required!")
+        new = self.new_cls()
+        old_address = ctypes.addressof(old)
+        new_address = ctypes.addressof(new)
+        for old_offset, new_offset, size in self.runs:
+            ctypes.memmove(new_address + new_offset, old_address + old_offset, size)
+        for getter, setter in zip(self.getters, self.setters):
+            setter(new, getter(old))
+        if self.checksums:
+            buffer = memoryview(new).cast("B")
+            for checksum in self.checksums:
+                checksum.update(buffer)
+        return new
+
+    def convert_records(self, data) -> bytes:
+        """
+        Converts many records at once. With numpy, the runs and the conversions are done column-wise
+        for all the records, otherwise the records are converted one by one.
+
+        :param data: bytes-like object holding the old records one after another
+        :return: the new records
+        """
+        data = memoryview(data).cast("B")
+        if len(data) % self.old_size:
+            raise ValueError(
+                f"Buffer length {len(data)} is not a multiple of the record size {self.old_size}!"
+            )
+        count = len(data) // self.old_size
+        np = _pyembc._get_numpy()
+        if np is None:
+            return b''.join(
+                bytes(self.convert(self.old_cls.from_buffer_copy(data, i * self.old_size)))
+                for i in range(count)
+            )
+        src = np.frombuffer(data, dtype=np.uint8).reshape(count, self.old_size)
+        dst = np.zeros((count, self.new_size), dtype=np.uint8)
+        for old_offset, new_offset, size in self.runs:
+            dst[:, new_offset:new_offset + size] = src[:, old_offset:old_offset + size]
+        bitfield_values = {}
+        for path, old, new in self.conversions:
+            values = self._read_column(np, data, count, path, old)
+            if _is_float_to_int(old, new):
+                values = self._integral_column(np, path, new, values)
+            if new[0].is_bitfield:
+                bitfield_values[path] = values
+            else:
+                self._write_column(np, dst, count, path, new, values)
+        if bitfield_values:
+            encode_bitfields(self.new_cls, bitfield_values, dst)
+        if self.checksums:
+            buffer = memoryview(dst).cast("B")
+            for base in range(0, count * self.new_size, self.new_size):
+                for checksum in self.checksums:
+                    checksum.update(buffer, base)
+        return dst.tobytes()
+
+    def _read_column(self, np, data, count: int, path: str, old):
+        field_type, offset, endian = old
+        if field_type.is_bitfield:
+            return decode_bitfields(self.old_cls, data, fields=[path])[path]
+        dtype = np.dtype(field_type.base_type).newbyteorder("<" if endian == "little" else ">")
+        return np.ndarray((count,), dtype=dtype, buffer=data, offset=offset, strides=(self.old_size,))
+
+    def _integral_column(self, np, path: str, new, values):
+        """
+        Converts a float column to an integer one, for an integer field. The checks are done before the
+        conversion, as numpy converts the non-integral, non-finite and out of range values silently.
+
+        :param np: numpy module
+        :param path: dotted path of the field
+        :param new: flattened new field
+        :param values: float column
+        :return: integer column
+        :raises: ValueError if a value is not an integer or does not fit the field
+        """
+        field_type = new[0]
+        if field_type.is_bitfield:
+            signed = getattr(field_type.base_type, _CTYPES_TYPE_ATTR).islower()
+            low = -(1 << (field_type.bit_size - 1)) if signed else 0
+            high = (1 << (field_type.bit_size - 1)) - 1 if signed else (1 << field_type.bit_size) - 1
+        else:
+            info = np.iinfo(np.dtype(field_type.base_type))
+            low, high = int(info.min), int(info.max)
+        # non-finite values are not integral either
+        with np.errstate(invalid="ignore"):
+            if not np.all(values == np.trunc(values)):
+                raise ValueError(f"Values of field {path} are not all integers!")
+        # the upper bound is compared as high + 1, which is exact as a float, unlike the maximum of 64 bit types
+        if not np.all((values >= low) & (values < high + 1)):
+            raise ValueError(f"Values of field {path} do not fit into {field_type.base_type.__name__}!")
+        return values.astype(np.int64 if low < 0 else np.uint64)
+
+    def _write_column(self, np, dst, count: int, path: str, new, values):
+        field_type, offset, endian = new
+        dtype = np.dtype(field_type.base_type).newbyteorder("<" if endian == "little" else ">")
+        converted = values.astype(dtype)
+        if values.dtype.kind in "iu" and dtype.kind in "iu" and np.any(converted != values):
+            raise ValueError(f"Values of field {path} do not fit into {field_type.base_type.__name__}!")
+        column = np.ndarray((count,), dtype=dtype, buffer=dst, offset=offset, strides=(self.new_size,))
+        column[:] = converted
+
+
+def _get_migration(old_cls, new_cls) -> _Migration:
+    migration = _migrations.get((old_cls, new_cls))
+    if migration is None:
+        migration = _Migration(old_cls, new_cls)
+        with _migrations_lock:
+            migration = _migrations.setdefault((old_cls, new_cls), migration)
+    return migration
+
+
+def _migration_chain(old_cls, new_cls) -> List[_Migration]:
+    """
+    Returns the migrations from old_cls to new_cls. If new_cls evolves from old_cls through several
+    revisions (see evolves_from), the migration goes revision by revision, otherwise directly.
+
+    :param old_cls: old pyembc class
+    :param new_cls: new pyembc class
+    :return: list of the migrations to apply
+    """
+    chain = [new_cls]
+    while chain[-1] is not old_cls:
+        previous = getattr(chain[-1], _EVOLVES_FROM, None)
+        if previous is None:
+            return [_get_migration(old_cls, new_cls)]
+        chain.append(previous)
+    chain.reverse()
+    return [_get_migration(old, new) for old, new in zip(chain, chain[1:])]
+
+
+def migrate(old, new_cls):
+    """
+    Converts an instance to a new layout revision.
+
+    :param old: instance of the old pyembc class
+    :param new_cls: new pyembc class
+    :return: instance of new_cls
+    :raises: TypeError if the layouts cannot be migrated, ValueError if a value does not fit its new field
+    """
+    for migration in _migration_chain(type(old), new_cls):
+        old = migration.convert(old)
+    return old
+
+
+def migrate_records(old_cls, new_cls, data) -> bytes:
+    """
+    Converts many records to a new layout revision at once.
+
+    :param old_cls: old pyembc class
+    :param new_cls: new pyembc class
+    :param data: bytes-like object holding the old records one after another
+    :return: the new records one after another
+    :raises: TypeError if the layouts cannot be migrated, ValueError if a value does not fit its new field
+    """
+    for migration in _migration_chain(old_cls, new_cls):
+        data = migration.convert_records(data)
+    return bytes(data)
@@ -1,8 +1,15 @@
 import sys
+import array
 import ctypes
 import struct
+import operator
+import functools
+import weakref
 from enum import Enum, auto
-from typing import Type, Any, Iterable, Dict, Optional, Mapping
+from typing import Type, Any, Iterable, Dict, Optional, Mapping, Tuple, Iterator, List, Callable
+
+from ._checksum import Checksum, _ChecksumField, _CHECKSUMS
+
 
 __all__ = [
     "pyembc_struct",
@@ -14,6 +21,13 @@ _SYS_ENDIANNESS_IS_LITTLE = sys.byteorder == "little"
 #  name for holding pyembc fields and endianness
 _FIELDS = "__pyembc_fields__"
 _ENDIAN = "__pyembc_endian__"
+# name for holding the previous layout revision of a structure
+_EVOLVES_FROM = "__pyembc_evolves_from__"
+# names for holding whether a class is frozen, and its field setter with the value checks
+_FROZEN = "__pyembc_frozen__"
+_SETATTR = "__pyembc_setattr__"
+# name for holding the compiled dotted path getters
+_GETTERS = "__pyembc_getters__"
 # name of the field in ctypes instances that hold the struct char
 _CTYPES_TYPE_ATTR = "_type_"
 # name of the field in ctypes Structure/Union instances that hold the fields
@@ -22,6 +36,17 @@ _CTYPES_FIELDS_ATTR = "_fields_"
 _CTYPES_PACK_ATTR = "_pack_"
 # name of the field in ctypes Structure instances that are non-native-byteorder
 _CTYPES_SWAPPED_ATTR = "_swappedbytes_"
+# registry of the generated classes, and hooks that are called with each newly generated class
+_CLASSES = weakref.WeakSet()
+_CLASS_HOOKS = []
+# numpy module. It is optional, and imported on first use, as importing it is slow.
+# False: not imported yet, None: not installed
+_np = False
+# array.array typecodes for the ctypes struct chars that can be exported to columns
+_ARRAY_TYPECODES = {
+    "b": "b", "B": "B", "h": "h", "H": "H", "i": "i", "I": "I",
+    "l": "l", "L": "L", "q": "q", "Q": "Q", "f": "f", "d": "d", "?": "B"
+}
 
 
 class PyembcFieldType:
@@ -35,6 +60,12 @@ class PyembcFieldType:
         self.base_type = _type
         self.bit_size = bit_size
         self.bit_offset = bit_offset
+        # byte offset in the containing structure/union, set when the class is generated
+        self.offset = None
+        # position of the LSB of a bitfield in its storage unit, set when the class is generated
+        self.bit_shift = None
+        # Checksum annotation of checksum fields
+        self.checksum = None
 
     @property
     def is_bitfield(self) -> bool:
@@ -178,11 +209,194 @@ def _c_type_name(typeobj: PyembcFieldType) -> str:
         return f"{signed} {name}"
 
 
-def __len_for_union(self):
+def _leaf_fields(cls, prefix: str = "") -> Iterator[Tuple[str, PyembcFieldType]]:
+    """
+    Walks the field table of a pyembc class recursively, and yields the non-pyembc (leaf) fields.
+
+    :param cls: pyembc class
+    :param prefix: prefix of the dotted path, used for the recursion
+    :return: iterator of (dotted path, field type) pairs
+    """
+    for field_name, field_type in getattr(cls, _FIELDS).items():
+        if _is_pyembc_type(field_type):
+            yield from _leaf_fields(field_type.base_type, f"{prefix}{field_name}.")
+        else:
+            yield f"{prefix}{field_name}", field_type
+
+
+def _leaf_spans(cls, base: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    Walks the field table of a pyembc class recursively, and yields the absolute byte spans of the leaf fields.
+
+    :param cls: pyembc class
+    :param base: offset of cls in the outermost class, used for the recursion
+    :return: iterator of (offset, size) pairs
+    """
+    for field_type in getattr(cls, _FIELDS).values():
+        if _is_pyembc_type(field_type):
+            yield from _leaf_spans(field_type.base_type, base + field_type.offset)
+        else:
+            yield base + field_type.offset, ctypes.sizeof(field_type.base_type)
+
+
+def _significant_ranges(cls) -> List[Tuple[int, int]]:
+    """
+    Collects the byte ranges of a pyembc class that are covered by its fields, leaving out the padding.
+
+    :param cls: pyembc class
+    :return: list of (start, end) byte offsets
+    """
+    covered = bytearray(ctypes.sizeof(cls))
+    for offset, size in _leaf_spans(cls):
+        covered[offset:offset + size] = b'\x01' * size
+    ranges = []
+    start = None
+    for i, is_covered in enumerate(covered + b'\x00'):
+        if is_covered and start is None:
+            start = i
+        elif not is_covered and start is not None:
+            ranges.append((start, i))
+            start = None
+    return ranges
+
+
+def _make_key(cls) -> Callable[[Any], Any]:
+    """
+    Creates the function that gets the significant bytes of an instance, used for comparing and hashing.
+
+    :param cls: pyembc class
+    :return: key function
+    """
+    ranges = _significant_ranges(cls)
+    if ranges == [(0, ctypes.sizeof(cls))]:
+        # no padding
+        return bytes
+    if not ranges:
+        return lambda instance: b''
+    getter = operator.itemgetter(*(slice(start, end) for start, end in ranges))
+    return lambda instance: getter(bytes(instance))
+
+
+def _set_field(instance, name: str, value: Any):
+    """
+    Sets a field with the value checks, also for the instances of frozen classes, for their construction.
+
+    :param instance: pyembc instance
+    :param name: name of the field
+    :param value: value to set
     """
-    Monkypatch __len__() method for ctypes.Union
+    cls = type(instance)
+    if getattr(cls, _FROZEN):
+        getattr(cls, _SETATTR)(instance, name, value)
+    else:
+        setattr(instance, name, value)
+
+
+def _get_numpy():
     """
-    return ctypes.sizeof(self)
+    Gets the numpy module, importing it on the first call.
+
+    :return: numpy module, or None if it is not installed
+    """
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - numpy is optional
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def _frozen_instance_error() -> Type[Exception]:
+    """
+    Gets the exception raised on modifying a frozen instance. dataclasses is imported on the first call, as
+    it takes a large part of the import time, and only the frozen classes need it.
+
+    :return: dataclasses.FrozenInstanceError
+    """
+    from dataclasses import FrozenInstanceError
+    return FrozenInstanceError
+
+
+def _array_shape(array_type: Type) -> Tuple[Tuple[int, ...], Type]:
+    """
+    Gets the shape and the item type of a (possibly multidimensional) ctypes array type
+
+    :param array_type: ctypes array type
+    :return: shape and innermost item type
+    """
+    shape = []
+    while issubclass(array_type, ctypes.Array):
+        shape.append(array_type._length_)
+        array_type = array_type._type_
+    return tuple(shape), array_type
+
+
+def _array_to_list(array: ctypes.Array) -> list:
+    """
+    Converts a ctypes array to a (nested) list. The items of structure/union type are converted to dicts.
+
+    :param array: ctypes array
+    :return: list of the values
+    """
+    return [
+        _array_to_list(item) if isinstance(item, ctypes.Array)
+        else item.to_dict() if hasattr(item, _FIELDS)
+        else item
+        for item in array
+    ]
+
+
+def _fill_array(array: ctypes.Array, values: Iterable):
+    """
+    Fills a ctypes array from a (nested) list, the inverse of _array_to_list(), with the value checks.
+
+    :param array: ctypes array to fill
+    :param values: values
+    :raises: ValueError if the length or a value is invalid
+    """
+    values = list(values)
+    if len(values) != len(array):
+        raise ValueError(f"{len(values)} values given for an array of length {len(array)}!")
+    item_type = array._type_
+    for i, value in enumerate(values):
+        if issubclass(item_type, ctypes.Array):
+            _fill_array(array[i], value)
+        elif hasattr(item_type, _FIELDS):
+            array[i] = item_type.from_dict(value)
+        else:
+            _check_value_for_type(PyembcFieldType(_type=item_type, bit_size=None, bit_offset=None), value)
+            array[i] = value
+
+
+def _make_column(field_type: PyembcFieldType, values: list):
+    """
+    Creates a column from a list of values: a numpy array if numpy is available, array.array otherwise.
+    Array fields need numpy, and get one column dimension per array dimension.
+
+    :param field_type: pyembc type object of the column
+    :param values: list of the values
+    :return: numpy array or array.array
+    """
+    np = _get_numpy()
+    if issubclass(field_type.base_type, ctypes.Array):
+        shape, item_type = _array_shape(field_type.base_type)
+        if np is None or hasattr(item_type, _FIELDS):
+            raise TypeError(
+                f"{field_type.base_type.__name__} cannot be exported to a column! Array fields of simple types "
+                f"can be exported with numpy."
+            )
+        column = np.array([_array_to_list(value) for value in values], dtype=np.dtype(item_type))
+        return column.reshape((len(values), *shape))
+    if np is not None:
+        return np.array(values, dtype=np.dtype(field_type.base_type))
+    struct_char = getattr(field_type.base_type, _CTYPES_TYPE_ATTR)
+    try:
+        typecode = _ARRAY_TYPECODES[struct_char]
+    except KeyError:
+        raise TypeError(f"{field_type.base_type.__name__} cannot be exported to a column!") from None
+    return array.array(typecode, values)
 
 
 def _print_field_value(field, typeobj):
@@ -192,35 +406,89 @@ def _print_field_value(field, typeobj):
         return f"0x{field:X}"
 
 
-def __repr_for_union(self):
+def _union_slot_placeholder(self, *args, **kwargs):
     """
-    Monkypatch __repr__() method for ctypes.Union
+    Placeholder for the special methods of the generated unions, replaced by the generated methods.
     """
-    _fields = getattr(self, _FIELDS)
-    field_count = len(_fields)
-    s = f'{self.__class__.__name__}('
-    for i, (field_name, field_type) in enumerate(_fields.items()):
-        _field = getattr(self, field_name)
-        if _is_pyembc_type(field_type):
-            s += f"{field_name}={repr(_field)}"
-        else:
-            if field_type.is_bitfield:
-                bitfield_info = field_type.bit_size
-            else:
-                bitfield_info = ''
-            s += f"{field_name}:{_short_type_name(field_type)}{bitfield_info}={_print_field_value(_field, field_type)}"
-        if i < field_count - 1:
-            s += ", "
-    s += ')'
-    return s
+    raise NotImplementedError
 
 
-# Monkypatch ctypes.Union: it only works like this, because Union is a metaclass,
-# and the method with exec/setattr does not work for it, as described here:
+# special methods of the generated unions. The metaclass of ctypes.Union does not update the slots of
+# the special methods, when they are set after the class is created, as described here:
 #   https://stackoverflow.com/questions/53563561/monkey-patching-class-derived-from-ctypes-union-doesnt-work
-# However, it only seems to be needed for __len__ and __repr__.
-ctypes.Union.__len__ = __len_for_union
-ctypes.Union.__repr__ = __repr_for_union
+# Therefore, placeholders are given at the class creation, which makes the slots look the methods up
+# in the class on each call, and the generated methods replace the placeholders later.
+_UNION_SLOTS = ("__init__", "__len__", "__repr__", "__setattr__")
+
+
+def _set_class_attribute(cls: Type, name: str, value: Any):
+    """
+    Sets an attribute of a generated class. ctypes.Union classes do not invalidate the type attribute
+    cache on attribute setting (their metaclass uses the generic object setattr), which makes them
+    use the stale, possibly freed attribute, so the cache is invalidated here explicitly.
+
+    :param cls: class to modify
+    :param name: name of the attribute
+    :param value: value of the attribute
+    """
+    setattr(cls, name, value)
+    if issubclass(cls, ctypes.Union) and hasattr(ctypes, "pythonapi"):
+        ctypes.pythonapi.PyType_Modified(ctypes.py_object(cls))
+
+
+def _compile_getter(cls, path: str):
+    """
+    Compiles a getter for a dotted path of fields. Leaf fields are read directly from the buffer
+    with struct at their absolute offsets, without creating the wrappers of the nested structures.
+
+    :param cls: pyembc class
+    :param path: dotted path, like "first.a"
+    :return: getter function, that gets an instance
+    :raises: AttributeError for invalid paths
+    """
+    owner = cls
+    offset = 0
+    names = path.split(".")
+    for i, name in enumerate(names):
+        try:
+            field_type = getattr(owner, _FIELDS)[name]
+        except KeyError:
+            raise AttributeError(f"{owner.__name__} has no field {name}!") from None
+        offset += field_type.offset
+        is_last = i == len(names) - 1
+        if _is_pyembc_type(field_type):
+            if is_last:
+                return operator.attrgetter(path)
+            owner = field_type.base_type
+        elif not is_last:
+            raise AttributeError(f"{owner.__name__}.{name} is not a structure or union!")
+    if not field_type.is_ctypes_simple_type:
+        return operator.attrgetter(path)
+    byteorder = "<" if getattr(owner, _ENDIAN) == "little" else ">"
+    struct_char = getattr(field_type.base_type, _CTYPES_TYPE_ATTR)
+    if not field_type.is_bitfield:
+        unpack_from = struct.Struct(f"{byteorder}{struct_char}").unpack_from
+        return lambda instance: unpack_from(instance, offset)[0]
+    # bitfields are read as their unsigned storage unit, and shifted/masked
+    unpack_from = struct.Struct(f"{byteorder}{struct_char.upper()}").unpack_from
+    shift = field_type.bit_shift
+    mask = (1 << field_type.bit_size) - 1
+    if struct_char.isupper():
+        return lambda instance: (unpack_from(instance, offset)[0] >> shift) & mask
+    sign = 1 << (field_type.bit_size - 1)
+    return lambda instance: (((unpack_from(instance, offset)[0] >> shift) & mask) ^ sign) - sign
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(code: str):
+    """
+    Compiles the code of a generated method. Many methods have the same code for every class (e.g.
+    __len__()), so the compiled code objects are cached.
+
+    :param code: source code
+    :return: code object
+    """
+    return compile(code, "<string>", "exec")
 
 
 def _add_method(
@@ -261,7 +529,8 @@ def _add_method(
         "_c_type_name": _c_type_name,
         "_is_little_endian": _is_little_endian,
         "_check_value_for_type": _check_value_for_type,
-        "_print_field_value": _print_field_value
+        "_print_field_value": _print_field_value,
+        "_make_column": _make_column
     }
     # update globals and locals
     if _globals is not None:
@@ -272,15 +541,30 @@ def _add_method(
     args = ','.join(args)
     code = f"def {name}({args}){return_annotation}:\n{body}"
     # execute it and save to the class
-    exec(code, __globals, __locals)
+    exec(_compile(code), __globals, __locals)
     method = __locals[name]
     method.__doc__ = docstring
     if class_method:
         method = classmethod(method)
-    setattr(cls, name, method)
+    _set_class_attribute(cls, name, method)
+
+
+def _migrate(cls, old):
+    """
+    Converts an instance of a previous layout revision to a new instance of cls.
+
+    :param cls: pyembc class
+    :param old: instance of a previous layout revision
+    :return: new instance
+    """
+    # imported here, because the migration module depends on this one
+    from ._migration import migrate
+    return migrate(old, cls)
 
 
-def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
+def _generate_class(
+        _cls, target: _PyembcTarget, endian=sys.byteorder, pack=4, evolves_from=None, eq=True, frozen=False
+):
     """
     Generates a new class based on the decorated one that we gen in the _cls parameter.
     Adds methods, sets bases, etc.
@@ -289,6 +573,9 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
     :param target: union/struct
     :param endian: endianness for structures. Default is the system's byteorder.
     :param pack: packing for structures
+    :param evolves_from: previous layout revision of the structure
+    :param eq: if True, __eq__ is generated, comparing the bytes of the fields
+    :param frozen: if True, the fields cannot be set after the construction, and __hash__ is generated if eq
     :return: generated class
     """
     # get the original class' annotations, we will parse these and generate the fields from these.
@@ -312,11 +599,21 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
         raise ValueError("Invalid endianness")
 
     # create the new class
-    cls = type(_cls.__name__, (_bases[target], ), {})
+    if target is _PyembcTarget.UNION:
+        namespace = {name: _union_slot_placeholder for name in _UNION_SLOTS}
+        if eq:
+            namespace.update(__eq__=_union_slot_placeholder, __hash__=_union_slot_placeholder)
+    else:
+        namespace = {}
+    # keep the origin of the decorated class, e.g. for telling apart classes of the same name
+    namespace.update(__module__=_cls.__module__, __qualname__=_cls.__qualname__)
+    cls = type(_cls.__name__, (_bases[target], ), namespace)
 
     # set our special attribute to save fields
     setattr(cls, _FIELDS, {})
     _fields = getattr(cls, _FIELDS)
+    setattr(cls, _GETTERS, {})
+    setattr(cls, _FROZEN, frozen)
 
     # go through the annotations and create fields
     _ctypes_fields = []
@@ -324,33 +621,34 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
     _bitfield_counter = 0
     _bitfield_basetype_bitsize = 0
     _bitfield_basetype = None
-    bit_offset = None
     for field_cnt, (field_name, _field_type) in enumerate(cls_annotations.items()):
+        checksum = None
+        if isinstance(_field_type, Checksum):
+            checksum = _field_type
+            _field_type = checksum.base_type
         if isinstance(_field_type, tuple):
             __field_type, bit_size = _field_type
             if _bitfield_counter == 0:
-                _bitfield_counter = bit_size
                 _bitfield_basetype_bitsize = struct.calcsize(__field_type._type_) * 8
                 _bitfield_basetype = __field_type
-                bit_offset = 0
-            else:
-                _bitfield_counter += bit_size
-                if __field_type != _bitfield_basetype:
-                    raise SyntaxError("Bitfields must be of same type!")
-                if _bitfield_counter > _bitfield_basetype_bitsize:
-                    raise SyntaxError("Bitfield overflow!")
-                if _bitfield_counter == _bitfield_basetype_bitsize:
-                    # full bitfield
-                    _bitfield_counter = 0
-                    _bitfield_offset = 0
-                    _bitfield_basetype_bitsize = 0
-                    _bitfield_basetype = None
-                bit_offset = (_bitfield_counter - bit_size)
+            elif __field_type != _bitfield_basetype:
+                raise SyntaxError("Bitfields must be of same type!")
+            # bit offset in the storage unit, counted in definition order
+            bit_offset = _bitfield_counter
+            _bitfield_counter += bit_size
+            if _bitfield_counter > _bitfield_basetype_bitsize:
+                raise SyntaxError("Bitfield overflow!")
+            if _bitfield_counter == _bitfield_basetype_bitsize:
+                # full bitfield
+                _bitfield_counter = 0
+                _bitfield_basetype_bitsize = 0
+                _bitfield_basetype = None
         else:
             if _bitfield_counter > 0:
                 raise SyntaxError("Incomplete bitfield definition!")
             __field_type = _field_type
             bit_size = None
+            bit_offset = None
         if field_cnt == len(cls_annotations) - 1:
             if _bitfield_counter > 0:
                 raise SyntaxError("Incomplete bitfield definition!")
@@ -360,6 +658,21 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
             raise TypeError(
                 f'Invalid type for field "{field_name}". Only ctypes types can be used!'
             )
+        if frozen and _is_pyembc_type(field_type) and not getattr(field_type.base_type, _FROZEN):
+            # otherwise, the instance could be modified through the nested one
+            raise TypeError(f'Field "{field_name}" of a frozen class must be of a frozen class as well!')
+        if frozen and issubclass(field_type.base_type, ctypes.Array):
+            # the items of the arrays could be set in place, bypassing the frozen setter
+            raise TypeError(f'Field "{field_name}" of a frozen class must not be an array!')
+        if checksum is not None:
+            if target is _PyembcTarget.UNION:
+                raise TypeError('Checksum fields are not supported in a Union!')
+            if not field_type.is_ctypes_simple_type or field_type.base_type._type_ not in "bBhHiIlLqQ":
+                raise TypeError(f'Checksum field "{field_name}" must be of an integer type!')
+            field_type.checksum = checksum
+        if target is _PyembcTarget.UNION and _is_pyembc_type(field_type) and getattr(field_type.base_type, _CHECKSUMS):
+            # the members overlap, so the checksums of the members could not be kept up to date
+            raise TypeError(f'Member "{field_name}" of a Union must not have checksum fields!')
         if target is _PyembcTarget.UNION:
             # for unions, check if all sub-struct has the same endianness.
             if field_type.is_structure:
@@ -379,8 +692,48 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
     # set the ctypes special attributes, note, _pack_ must be set before _fields_!
     setattr(cls, _CTYPES_PACK_ATTR, pack)
     setattr(cls, _CTYPES_FIELDS_ATTR, _ctypes_fields)
+    # now that ctypes has laid out the fields, save their byte offsets and the bit shifts of the bitfields.
+    # ctypes allocates the bitfields from the LSB of the storage unit in little endian structures,
+    # and from the MSB in big endian ones.
+    for field_name, field_type in _fields.items():
+        field_type.offset = getattr(cls, field_name).offset
+        if field_type.is_bitfield:
+            if endian == "little":
+                field_type.bit_shift = field_type.bit_offset
+            else:
+                unit_bit_size = ctypes.sizeof(field_type.base_type) * 8
+                field_type.bit_shift = unit_bit_size - field_type.bit_offset - field_type.bit_size
     # save the endianness to us, because union streaming/building will need this
     setattr(cls, _ENDIAN, endian)
+    if evolves_from is not None and not hasattr(evolves_from, _FIELDS):
+        raise TypeError("evolves_from must be a pyembc class!")
+    setattr(cls, _EVOLVES_FROM, evolves_from)
+
+    # compile the checksum computations, including the ones of the nested structures, which must be
+    # updated first, as the checksums of the containing structure may cover them. The ones of the union
+    # members are not included, as those overlap each other.
+    _checksums = []
+    for field_name, field_type in _fields.items():
+        if target is _PyembcTarget.UNION:
+            break
+        if _is_pyembc_type(field_type):
+            _checksums.extend(
+                checksum.shifted(f"{field_name}.", field_type.offset)
+                for checksum in getattr(field_type.base_type, _CHECKSUMS)
+            )
+        elif field_type.checksum is not None:
+            if not 0 <= field_type.checksum.start < field_type.offset:
+                raise SyntaxError(f'Checksum field "{field_name}" must follow the bytes it covers!')
+            _checksums.append(_ChecksumField(
+                name=field_name,
+                offset=field_type.offset,
+                start=field_type.checksum.start,
+                func=field_type.checksum.func,
+                # the checksums are unsigned, so they are packed as unsigned even into signed fields
+                fmt=("<" if endian == "little" else ">") + field_type.base_type._type_.upper(),
+                size=ctypes.sizeof(field_type.base_type)
+            ))
+    setattr(cls, _CHECKSUMS, tuple(_checksums))
 
     # Add the generated methods
 
@@ -388,36 +741,59 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
     #           __init__
     # ---------------------------------------------------
     docstring = "init method for the class"
-    body = f"""
-        fields = getattr(self, '{_FIELDS}')
-        if args:
-            if kwargs:
-                raise TypeError('Either positional arguments, or keyword arguments must be given!')
-            if len(args) == len(fields):
-                for arg_val, field_name in zip(args, fields):
-                    setattr(self, field_name, arg_val)
-            else:
-                raise TypeError('Invalid number of arguments!')
-        if kwargs:
+    if target is _PyembcTarget.UNION:
+        # the members of a union overlap, so any of them can be initialized, like with ctypes.Union
+        body = f"""
+            fields = getattr(self, '{_FIELDS}')
+            if len(args) > len(fields):
+                raise TypeError('Too many positional arguments!')
+            for arg_val, field_name in zip(args, fields):
+                _setattr(self, field_name, arg_val)
+            for field_name, arg_val in kwargs.items():
+                if field_name not in fields:
+                    raise TypeError(f'Unknown keyword argument {{field_name}}!')
+                _setattr(self, field_name, arg_val)
+        """
+    else:
+        body = f"""
+            fields = getattr(self, '{_FIELDS}')
             if args:
-                raise TypeError('Either positional arguments, or keyword arguments must be given!')
-            if len(kwargs) == len(fields):
-                for field_name in fields:
-                    try:
-                        arg_val = kwargs[field_name]
-                    except KeyError:
-                        raise TypeError(f'Keyword argument {{field_name}} not specified!')
-                    setattr(self, field_name, arg_val)
-            else:
-                raise TypeError('Invalid number of keyword arguments!')
-    """
+                if kwargs:
+                    raise TypeError('Either positional arguments, or keyword arguments must be given!')
+                if len(args) == len(fields):
+                    for arg_val, field_name in zip(args, fields):
+                        _setattr(self, field_name, arg_val)
+                else:
+                    raise TypeError('Invalid number of arguments!')
+            if kwargs:
+                if args:
+                    raise TypeError('Either positional arguments, or keyword arguments must be given!')
+                if len(kwargs) == len(fields):
+                    for field_name in fields:
+                        try:
+                            arg_val = kwargs[field_name]
+                        except KeyError:
+                            raise TypeError(f'Keyword argument {{field_name}} not specified!')
+                        _setattr(self, field_name, arg_val)
+                else:
+                    raise TypeError('Invalid number of keyword arguments!')
+        """
+    if frozen and _checksums:
+        # the checksums of frozen instances are computed once, as their contents cannot change
+        body += """
+            buffer = memoryview(self).cast('B')
+            for checksum in _checksums:
+                checksum.update(buffer)
+        """
     _add_method(
         cls=cls,
         name="__init__",
         args=('self', '*args', '**kwargs',),
         body=body,
         docstring=docstring,
-        return_type=None
+        return_type=None,
+        # frozen classes are constructed through their setter with the value checks
+        _globals={"_setattr": _set_field if frozen else setattr, "_checksums": _checksums}
     )
 
     # ---------------------------------------------------
@@ -449,6 +825,24 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
                 _bytearray.reverse()
                 return bytes(_bytearray)
         """
+    elif _checksums and frozen:
+        # frozen instances are not modified, but their checksums may still be stale, e.g. after
+        # from_buffer_copy(), so they are filled in into the copy only
+        docstring = "gets the bytestream of the instance, with the checksum fields filled in"
+        body = f"""
+            buffer = memoryview(bytearray(self))
+            for checksum in _checksums:
+                checksum.update(buffer)
+            return buffer.tobytes()
+        """
+    elif _checksums:
+        docstring = "fills in the checksum fields, and gets the bytestream of the instance"
+        body = f"""
+            buffer = memoryview(self).cast('B')
+            for checksum in _checksums:
+                checksum.update(buffer)
+            return bytes(self)
+        """
     else:
         body = f"""
             return bytes(self)
@@ -460,7 +854,7 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
         body=body,
         docstring=docstring,
         return_type=bytes,
-        _globals={"sys": sys}
+        _globals={"sys": sys, "_checksums": _checksums}
     )
 
     # ---------------------------------------------------
@@ -470,17 +864,91 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
     body = f"""
         if not isinstance(stream, bytes):
             raise TypeError("bytes required")
+        if len(stream) > ctypes.sizeof(self):
+            raise ValueError(f"{{len(stream)}} bytes do not fit into {{cls.__name__}}!")
+    """
+    args = ("self", "stream")
+    if _checksums:
+        docstring = (
+            "parses the instance values from a bytestream, and verifies the checksums if verify is True. "
+            "The instance is left unchanged on a checksum mismatch."
+        )
+        # the checksums are verified before the copy. A shorter stream only overwrites the beginning of
+        # the instance, so then the verification needs the would-be contents.
+        body += f"""
+        if verify:
+            if len(stream) == ctypes.sizeof(self):
+                buffer = memoryview(stream)
+            else:
+                contents = bytearray(self)
+                contents[:len(stream)] = stream
+                buffer = memoryview(contents)
+            for checksum in _checksums:
+                if not checksum.verify(buffer):
+                    raise ValueError(f"Checksum mismatch for field {{checksum.name}}!")
+        """
+        args = ("self", "stream", "verify=True")
+    body += f"""
         ctypes.memmove(ctypes.addressof(self), stream, len(stream))
     """
+    if frozen:
+        docstring = "Frozen instances cannot be parsed into, use from_buffer_copy() instead"
+        body = f"""
+        raise FrozenInstanceError(f"cannot parse into frozen {{cls.__name__}}")
+        """
     _add_method(
         cls=cls,
         name="parse",
-        args=("self", "stream"),
+        args=args,
         body=body,
         docstring=docstring,
-        return_type=None
+        return_type=None,
+        _globals={"_checksums": _checksums, "FrozenInstanceError": _frozen_instance_error() if frozen else None}
     )
 
+    if _checksums:
+        # ---------------------------------------------------
+        #           update_checksums()
+        # ---------------------------------------------------
+        docstring = "Computes the checksum fields from the current contents of the instance"
+        body = f"""
+        buffer = memoryview(self).cast('B')
+        for checksum in _checksums:
+            checksum.update(buffer)
+        """
+        if frozen:
+            docstring = "Frozen instances cannot be updated, stream() fills the checksums in into its result"
+            body = f"""
+        raise FrozenInstanceError(f"cannot update the checksums of frozen {{cls.__name__}}")
+            """
+        _add_method(
+            cls=cls,
+            name="update_checksums",
+            args=("self",),
+            body=body,
+            docstring=docstring,
+            return_type=None,
+            _globals={"_checksums": _checksums, "FrozenInstanceError": _frozen_instance_error() if frozen else None}
+        )
+
+        # ---------------------------------------------------
+        #           check_checksums()
+        # ---------------------------------------------------
+        docstring = "Checks whether the checksum fields match the current contents of the instance"
+        body = f"""
+        buffer = memoryview(self).cast('B')
+        return all(checksum.verify(buffer) for checksum in _checksums)
+        """
+        _add_method(
+            cls=cls,
+            name="check_checksums",
+            args=("self",),
+            body=body,
+            docstring=docstring,
+            return_type=bool,
+            _globals={"_checksums": _checksums}
+        )
+
     # ---------------------------------------------------
     #           ccode()
     # ---------------------------------------------------
@@ -489,7 +957,6 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
         code = []
         _typename = 'struct' if issubclass(cls, ctypes.Structure) else 'union'
         code.append(f"typedef {{_typename}} _tag_{{cls.__name__}} {{{{")
-        print(' ')
         for field_name, field_type in cls.{_FIELDS}.items():
             _field = getattr(cls, field_name)
             if _is_pyembc_type(field_type):
@@ -570,7 +1037,7 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
         field = self.__getattribute__(field_name)
         field_type = self.{_FIELDS}[field_name]
         if _is_pyembc_type(field_type):
-            if not isinstance(value, field_type):
+            if not isinstance(value, field_type.base_type):
                 raise TypeError(
                     f'invalid value for field "{{field_name}}"! Must be of type {{field_type}}!'
                 )
@@ -589,21 +1056,228 @@ def _generate_class(_cls, target: _PyembcTarget, endian=sys.byteorder, pack=4):
         docstring=docstring,
         return_type=None
     )
+    setattr(cls, _SETATTR, cls.__dict__["__setattr__"])
+    if frozen:
+        docstring = "Attribute setter of the frozen classes. Raises FrozenInstanceError."
+        body = f"""
+        raise FrozenInstanceError(f"cannot assign to field '{{field_name}}' of frozen {{cls.__name__}}")
+        """
+        _add_method(
+            cls=cls,
+            name="__setattr__",
+            args=('self', 'field_name', 'value',),
+            body=body,
+            docstring=docstring,
+            return_type=None,
+            _globals={"FrozenInstanceError": _frozen_instance_error()}
+        )
+
+    # the converters below are compiled from the field table, so no field walking happens at call time.
+    # nested pyembc types are passed to them as globals.
+    _nested_types = {
+        f"_type_{field_name}": field_type.base_type
+        for field_name, field_type in _fields.items() if _is_pyembc_type(field_type)
+    }
+
+    # ---------------------------------------------------
+    #           to_dict()
+    # ---------------------------------------------------
+    docstring = "Converts the instance to a (nested) dict of field values."
+    items = []
+    for field_name, field_type in _fields.items():
+        if _is_pyembc_type(field_type):
+            items.append(f"'{field_name}': self.{field_name}.to_dict(),")
+        elif issubclass(field_type.base_type, ctypes.Array):
+            # not the array itself, which is a view into the buffer of the instance
+            items.append(f"'{field_name}': _array_to_list(self.{field_name}),")
+        else:
+            items.append(f"'{field_name}': self.{field_name},")
+    body = "\n".join(
+        ["        return {"] + [f"            {item}" for item in items] + ["        }"]
+    )
+    _add_method(
+        cls=cls,
+        name="to_dict",
+        args=('self',),
+        body=body,
+        docstring=docstring,
+        return_type=Dict[str, Any],
+        _globals={"_array_to_list": _array_to_list}
+    )
+
+    # ---------------------------------------------------
+    #           from_dict()
+    # ---------------------------------------------------
+    docstring = "Creates an instance from a (nested) dict of field values. Missing fields are left zeroed."
+    lines = [
+        "        if not data.keys() <= _field_names:",
+        "            raise TypeError(f'Unknown fields: {sorted(data.keys() - _field_names)}!')",
+        "        self = cls()",
+    ]
+    for field_name, field_type in _fields.items():
+        lines.append(f"        if '{field_name}' in data:")
+        if _is_pyembc_type(field_type):
+            lines.append(
+                f"            _set_field(self, '{field_name}', _type_{field_name}.from_dict(data['{field_name}']))"
+            )
+        elif issubclass(field_type.base_type, ctypes.Array):
+            lines.append(f"            _fill_array(self.{field_name}, data['{field_name}'])")
+        else:
+            lines.append(f"            _set_field(self, '{field_name}', data['{field_name}'])")
+    if frozen and _checksums:
+        # like in __init__, the checksums of frozen instances are computed once, after setting the fields
+        lines += [
+            "        buffer = memoryview(self).cast('B')",
+            "        for checksum in _checksums:",
+            "            checksum.update(buffer)",
+        ]
+    lines.append("        return self")
+    _add_method(
+        cls=cls,
+        name="from_dict",
+        args=('cls', 'data'),
+        body="\n".join(lines),
+        docstring=docstring,
+        return_type=cls,
+        _globals={
+            "_field_names": frozenset(_fields), "_set_field": _set_field, "_fill_array": _fill_array,
+            "_checksums": _checksums, **_nested_types
+        },
+        class_method=True
+    )
+
+    # ---------------------------------------------------
+    #           to_columns()
+    # ---------------------------------------------------
+    docstring = (
+        "Converts a sequence of instances to flat columns, keyed by the dotted path of the leaf fields. "
+        "The columns are numpy arrays if numpy is available, array.array otherwise."
+    )
+    _leaves = list(_leaf_fields(cls))
+    lines = ["        records = list(records)", "        return {"]
+    for i, (path, field_type) in enumerate(_leaves):
+        lines.append(f"            '{path}': _make_column(_leaf_{i}, [r.{path} for r in records]),")
+    lines.append("        }")
+    _add_method(
+        cls=cls,
+        name="to_columns",
+        args=('cls', 'records'),
+        body="\n".join(lines),
+        docstring=docstring,
+        return_type=Dict[str, Any],
+        _globals={f"_leaf_{i}": field_type for i, (_, field_type) in enumerate(_leaves)},
+        class_method=True
+    )
+
+    # ---------------------------------------------------
+    #           get()
+    # ---------------------------------------------------
+    docstring = (
+        "Gets a field value by its dotted path, like 'first.a'. Leaf fields are read directly at their offset, "
+        "with a getter compiled on the first use of the path."
+    )
+    body = f"""
+        getter = _getters.get(path)
+        if getter is None:
+            getter = _getters.setdefault(path, _compile_getter(cls, path))
+        return getter(self)
+    """
+    _add_method(
+        cls=cls,
+        name="get",
+        args=('self', 'path'),
+        body=body,
+        docstring=docstring,
+        return_type=Any,
+        _globals={"_compile_getter": _compile_getter, "_getters": getattr(cls, _GETTERS)}
+    )
+
+    if eq:
+        # ---------------------------------------------------
+        #           __eq__
+        # ---------------------------------------------------
+        docstring = "Compares the bytes of the fields. The padding bytes are not compared."
+        body = f"""
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return _key(self) == _key(other)
+        """
+        _key = _make_key(cls)
+        _add_method(
+            cls=cls,
+            name="__eq__",
+            args=('self', 'other'),
+            body=body,
+            docstring=docstring,
+            return_type=bool,
+            _globals={"_key": _key}
+        )
+
+        # ---------------------------------------------------
+        #           __hash__
+        # ---------------------------------------------------
+        if frozen:
+            docstring = "Hashes the bytes of the fields. The padding bytes are not hashed."
+            body = f"""
+        return hash(_key(self))
+            """
+            _add_method(
+                cls=cls,
+                name="__hash__",
+                args=('self',),
+                body=body,
+                docstring=docstring,
+                return_type=int,
+                _globals={"_key": _key}
+            )
+        else:
+            # like with dataclasses, mutable instances that compare by value are not hashable
+            _set_class_attribute(cls, "__hash__", None)
+
+    # ---------------------------------------------------
+    #           migrate()
+    # ---------------------------------------------------
+    docstring = (
+        "Converts an instance of a previous layout revision (see evolves_from) to a new instance. "
+        "Matching fields are copied, new fields are left zeroed."
+    )
+    body = f"""
+        return _migrate(cls, old)
+    """
+    _add_method(
+        cls=cls,
+        name="migrate",
+        args=('cls', 'old'),
+        body=body,
+        docstring=docstring,
+        return_type=cls,
+        _globals={"_migrate": _migrate},
+        class_method=True
+    )
+
+    _CLASSES.add(cls)
+    for hook in _CLASS_HOOKS:
+        hook(cls)
 
     return cls
 
 
-def pyembc_struct(_cls=None, *, endian=sys.byteorder, pack: int = 4):
+def pyembc_struct(
+        _cls=None, *, endian=sys.byteorder, pack: int = 4, evolves_from=None, eq: bool = True, frozen: bool = False
+):
     """
     Magic decorator to create a user-friendly struct class
 
     :param _cls: used for distinguishing between call modes (with or without parens)
     :param endian: endianness. "little" or "big"
     :param pack: packing of the fields.
+    :param evolves_from: previous layout revision of the structure, that can be migrated with migrate()
+    :param eq: if True, the instances are compared by the bytes of their fields, without the padding
+    :param frozen: if True, the fields cannot be set after the construction, and the instances are hashable if eq
     :return:
     """
     def wrap(cls):
-        return _generate_class(cls, _PyembcTarget.STRUCT, endian, pack)
+        return _generate_class(cls, _PyembcTarget.STRUCT, endian, pack, evolves_from, eq, frozen)
     if _cls is None:
         # call with parens: @pyembc_struct(...)
         return wrap
@@ -612,12 +1286,14 @@ def pyembc_struct(_cls=None, *, endian=sys.byteorder, pack: int = 4):
         return wrap(_cls)
 
 
-def pyembc_union(_cls=None, *, endian=sys.byteorder):
+def pyembc_union(_cls=None, *, endian=sys.byteorder, eq: bool = True, frozen: bool = False):
     """
     Magic decorator to create a user-friendly union class
 
     :param _cls: used for distinguishing between call modes (with or without parens)
     :param endian: endianness. "little" or "big"
+    :param eq: if True, the instances are compared by the bytes of their members
+    :param frozen: if True, the members cannot be set after the construction, and the instances are hashable if eq
     :return: decorated class
     """
     if endian != sys.byteorder:
@@ -630,7 +1306,7 @@ def pyembc_union(_cls=None, *, endian=sys.byteorder):
         )
 
     def wrap(cls):
-        return _generate_class(cls, _PyembcTarget.UNION, endian)
+        return _generate_class(cls, _PyembcTarget.UNION, endian, eq=eq, frozen=frozen)
 
     if _cls is None:
         # call with parens: @pyembc_struct(...)
@@ -0,0 +1,139 @@
+import time
+import ctypes
+from typing import Iterable, Union
+
+from . import _stats
+from ._pyembc import _FROZEN
+from ._checksum import _CHECKSUMS
+
+__all__ = [
+    "parse_records",
+    "stream_records"
+]
+
+
+def _source(data, nbytes: int):
+    """
+    Gets an object that can be passed to ctypes.memmove as the source of a copy, without copying
+    the data if possible.
+
+    :param data: bytes-like object
+    :param nbytes: size of the data
+    :return: bytes or ctypes array sharing the memory of data
+    """
+    if isinstance(data, bytes):
+        return data
+    view = memoryview(data)
+    if view.readonly:
+        # ctypes cannot take the address of a read-only buffer, other than a bytes object
+        return view.tobytes()
+    return (ctypes.c_char * nbytes).from_buffer(view)
+
+
+def parse_records(cls, data, verify: bool = True) -> ctypes.Array:
+    """
+    Parses many records at once, with one memory copy, that releases the GIL while it runs.
+
+    :param cls: pyembc class of the records
+    :param data: bytes-like object holding the records one after another. Read-only buffers, other than
+        bytes, are copied first.
+    :param verify: if True, the checksum fields of the records are verified
+    :return: ctypes array of cls instances. Its items are views into the array, not copies.
+    :raises: ValueError if the buffer length is not a multiple of the record size, or on checksum mismatch
+    """
+    if not _stats._enabled:
+        return _parse_records(cls, data, verify)
+    t0 = time.perf_counter()
+    try:
+        return _parse_records(cls, data, verify)
+    finally:
+        _stats._record(_stats._key(cls, "parse_records"), _stats._nbytes(data), time.perf_counter() - t0)
+
+
+def _parse_records(cls, data, verify: bool) -> ctypes.Array:
+    record_size = ctypes.sizeof(cls)
+    nbytes = memoryview(data).nbytes
+    if nbytes % record_size:
+        raise ValueError(f"Buffer length {nbytes} is not a multiple of the record size {record_size}!")
+    records = (cls * (nbytes // record_size))()
+    if nbytes:
+        ctypes.memmove(records, _source(data, nbytes), nbytes)
+    checksums = getattr(cls, _CHECKSUMS, ())
+    if verify and checksums:
+        buffer = memoryview(records).cast("B")
+        for base in range(0, nbytes, record_size):
+            for checksum in checksums:
+                if not checksum.verify(buffer, base):
+                    raise ValueError(
+                        f"Checksum mismatch for field {checksum.name} in record {base // record_size}!"
+                    )
+    return records
+
+
+def stream_records(cls, records: Union[ctypes.Array, Iterable], out=None):
+    """
+    Streams many records at once. The checksum fields are filled in, like with stream(). The records of a
+    ctypes array (e.g. the result of parse_records()) are copied with one memory copy, the ones of other
+    iterables with one copy per record. The copies release the GIL while they run.
+
+    :param cls: pyembc class of the records
+    :param records: ctypes array of cls instances, or iterable of cls instances
+    :param out: writable bytes-like object for the records, e.g. a pre-allocated bytearray. Default is a
+        new bytearray.
+    :return: out
+    :raises: ValueError if out is too small, TypeError if the records are not of cls
+    """
+    if not isinstance(records, ctypes.Array):
+        records = list(records)
+    if not _stats._enabled:
+        return _stream_records(cls, records, out)
+    t0 = time.perf_counter()
+    try:
+        return _stream_records(cls, records, out)
+    finally:
+        _stats._record(
+            _stats._key(cls, "stream_records"), len(records) * ctypes.sizeof(cls), time.perf_counter() - t0
+        )
+
+
+def _stream_records(cls, records: Union[ctypes.Array, list], out):
+    record_size = ctypes.sizeof(cls)
+    if isinstance(records, ctypes.Array):
+        if records._type_ is not cls:
+            raise TypeError(f"Array of {cls.__name__} required!")
+    else:
+        for record in records:
+            if not isinstance(record, cls):
+                raise TypeError(f"{cls.__name__} instance required!")
+    nbytes = len(records) * record_size
+    if out is None:
+        out = bytearray(nbytes)
+    if memoryview(out).nbytes < nbytes:
+        raise ValueError(f"Output buffer is too small for {len(records)} records!")
+    if not nbytes:
+        return out
+    checksums = getattr(cls, _CHECKSUMS, ())
+    # frozen records are not modified, their checksums are filled in into the output only
+    frozen = getattr(cls, _FROZEN, False)
+    destination = (ctypes.c_char * nbytes).from_buffer(memoryview(out))
+    if isinstance(records, ctypes.Array):
+        if checksums and not frozen:
+            buffer = memoryview(records).cast("B")
+            for base in range(0, nbytes, record_size):
+                for checksum in checksums:
+                    checksum.update(buffer, base)
+        ctypes.memmove(destination, records, nbytes)
+    else:
+        address = ctypes.addressof(destination)
+        for i, record in enumerate(records):
+            if checksums and not frozen:
+                buffer = memoryview(record).cast("B")
+                for checksum in checksums:
+                    checksum.update(buffer)
+            ctypes.memmove(address + i * record_size, ctypes.addressof(record), record_size)
+    if checksums and frozen:
+        buffer = memoryview(destination).cast("B")
+        for base in range(0, nbytes, record_size):
+            for checksum in checksums:
+                checksum.update(buffer, base)
+    return out
@@ -0,0 +1,215 @@
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Any
+
+from ._pyembc import _CLASSES, _CLASS_HOOKS, _set_class_attribute
+
+__all__ = [
+    "enable_stats",
+    "disable_stats",
+    "reset_stats",
+    "stats",
+    "export_stats"
+]
+
+# the generated methods that are instrumented
+_INSTRUMENTED = ("parse", "stream", "__setattr__")
+# [calls, bytes, time] counters per (class module, class qualified name, method name). Keyed by the names,
+# so that the counters do not keep the classes alive, and classes of the same name in different modules
+# (or scopes) are counted separately.
+_counters: Dict[Any, list] = {}
+# the instrumented classes. Their original methods are kept by the wrappers, in __wrapped__.
+_instrumented = weakref.WeakSet()
+# reentrant, as the classes are instrumented under it in enable_stats(), and on their creation as well
+_lock = threading.RLock()
+# True while the statistics are collected. The bulk functions (parse_records(), stream_records()) are not
+# methods of the classes, so they check this flag instead of being replaced.
+_enabled = False
+
+
+def _key(cls, name: str) -> tuple:
+    """
+    Gets the counter key of a method
+
+    :param cls: pyembc class
+    :param name: name of the method
+    :return: (class module, class qualified name, method name)
+    """
+    return cls.__module__, cls.__qualname__, name
+
+
+def _record(key, nbytes: int, elapsed: float):
+    """
+    Updates the counters of a method
+
+    :param key: counter key, see _key()
+    :param nbytes: processed bytes
+    :param elapsed: elapsed time in seconds
+    """
+    with _lock:
+        counter = _counters.get(key)
+        if counter is None:
+            counter = _counters[key] = [0, 0, 0.0]
+        counter[0] += 1
+        counter[1] += nbytes
+        counter[2] += elapsed
+
+
+def _length(stream) -> int:
+    """
+    Gets the length of the parsed data, or 0 for invalid data, which parse() rejects.
+
+    :param stream: data passed to parse()
+    :return: length in bytes
+    """
+    try:
+        return len(stream)
+    except TypeError:
+        return 0
+
+
+def _nbytes(data) -> int:
+    """
+    Gets the size of a bytes-like object, or 0 for invalid data, which parse_records() rejects.
+
+    :param data: data passed to parse_records()
+    :return: size in bytes
+    """
+    try:
+        return memoryview(data).nbytes
+    except TypeError:
+        return 0
+
+
+def _wrap(cls, name: str, method: Callable) -> Callable:
+    """
+    Creates the instrumented version of a generated method.
+
+    :param cls: pyembc class
+    :param name: name of the method
+    :param method: original method
+    :return: instrumented method
+    """
+    key = _key(cls, name)
+    perf_counter = time.perf_counter
+
+    if name == "parse":
+        def wrapper(self, stream, *args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return method(self, stream, *args, **kwargs)
+            finally:
+                _record(key, _length(stream), perf_counter() - t0)
+    elif name == "stream":
+        def wrapper(self, *args, **kwargs):
+            t0 = perf_counter()
+            result = method(self, *args, **kwargs)
+            _record(key, len(result), perf_counter() - t0)
+            return result
+    else:
+        def wrapper(self, *args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                _record(key, 0, perf_counter() - t0)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def _instrument(cls):
+    """
+    Replaces the generated methods of a class with their instrumented versions.
+
+    :param cls: pyembc class
+    """
+    with _lock:
+        if cls in _instrumented:
+            return
+        for name in _INSTRUMENTED:
+            if name in cls.__dict__:
+                _set_class_attribute(cls, name, _wrap(cls, name, cls.__dict__[name]))
+        _instrumented.add(cls)
+
+
+def enable_stats():
+    """
+    Enables the collection of call counts, processed bytes and cumulative time of the parse(), stream() and
+    field setter methods of all pyembc classes, including the ones created later, and of parse_records()
+    and stream_records() per record class.
+    When disabled (the default), the original generated methods are used, so there is no overhead.
+    """
+    global _enabled
+    with _lock:
+        if _instrument in _CLASS_HOOKS:
+            return
+        _enabled = True
+        for cls in list(_CLASSES):
+            _instrument(cls)
+        _CLASS_HOOKS.append(_instrument)
+
+
+def disable_stats():
+    """
+    Disables the collection of the statistics, and restores the original methods. The collected
+    statistics are kept.
+    """
+    global _enabled
+    with _lock:
+        _enabled = False
+        if _instrument in _CLASS_HOOKS:
+            _CLASS_HOOKS.remove(_instrument)
+        for cls in list(_instrumented):
+            for name in _INSTRUMENTED:
+                if name in cls.__dict__:
+                    _set_class_attribute(cls, name, cls.__dict__[name].__wrapped__)
+        _instrumented.clear()
+
+
+def reset_stats():
+    """
+    Clears the collected statistics.
+    """
+    with _lock:
+        _counters.clear()
+
+
+def _snapshot(reset: bool) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Takes a snapshot of the collected statistics.
+
+    :param reset: if True, the statistics are cleared in the same step
+    :return: snapshot
+    """
+    snapshot = {}
+    with _lock:
+        for (module, qualname, name), (calls, nbytes, elapsed) in _counters.items():
+            snapshot.setdefault(f"{module}.{qualname}", {})[name] = {
+                "calls": calls, "bytes": nbytes, "time": elapsed
+            }
+        if reset:
+            _counters.clear()
+    return snapshot
+
+
+def stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Returns a snapshot of the collected statistics.
+
+    :return: {"module.qualified class name": {method name: {"calls": ..., "bytes": ..., "time": ...}}}
+    """
+    return _snapshot(reset=False)
+
+
+def export_stats(callback: Callable[[Dict[str, Dict[str, Dict[str, Any]]]], Any], reset: bool = False):
+    """
+    Passes a snapshot of the collected statistics to a callback, e.g. for sending it to a monitoring system.
+
+    :param callback: callable receiving the stats() snapshot
+    :param reset: if True, the statistics are cleared after taking the snapshot
+    """
+    callback(_snapshot(reset=reset))
@@ -26,10 +26,9 @@ setup(
     },
     author="csaba.nemes",
     author_email="waszil.waszil@gmail.com",
-    packages=find_packages(exclude=["test"]),
+    packages=find_packages(exclude=["test", "benchmarks"]),
     tests_require=[
-        "pytest",
-        "construct"
+        "pytest"
     ],
     install_requires=[],
     classifiers=[
@@ -0,0 +1,45 @@
+import json
+import os
+
+from benchmarks.bench_pyembc import BENCHMARKS, compare, run_benchmarks
+
+BASELINE = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "baseline.json")
+
+
+def test_benchmarks_run():
+    for setup in BENCHMARKS.values():
+        setup()()
+
+    results = run_benchmarks(["parse", "stream"], repeat=1, min_time=0, with_import=False)
+    assert set(results["results"]) == {"parse", "stream"}
+    assert results["results"]["parse"]["min"] > 0
+
+
+def test_benchmarks_compare():
+    baseline = {"results": {"a": {"min": 1.0}, "b": {"min": 2.0}, "c": {"min": 3.0}}}
+    # machine is 2x slower overall, c regressed by 3x on top of that
+    results = {"results": {"a": {"min": 2.0}, "b": {"min": 4.0}, "c": {"min": 18.0}, "new": {"min": 1.0}}}
+    assert compare(results, baseline, threshold=2.0) == {"c": 3.0}
+    assert compare(results, baseline, threshold=4.0) == {}
+
+
+def test_benchmarks_import_threshold():
+    baseline = {"results": {"a": {"min": 1.0}, "b": {"min": 2.0}, "import": {"min": 1.0}}}
+    # the import time does not move the machine ratio, and has its own threshold
+    results = {"results": {"a": {"min": 1.0}, "b": {"min": 2.0}, "import": {"min": 1.8}}}
+    assert compare(results, baseline, threshold=2.0, import_threshold=1.5) == {"import": 1.8}
+    assert compare(results, baseline, threshold=2.0, import_threshold=2.0) == {}
+
+
+def test_benchmarks_baseline():
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    results = run_benchmarks(repeat=3, min_time=0.01)
+    regressions = compare(results, baseline)
+    if regressions:
+        # the short runs are noisy, so the regressed benchmarks are timed again, longer, to confirm them
+        names = [name for name in regressions if name != "import"]
+        rerun = run_benchmarks(names, repeat=7, min_time=0.05, with_import="import" in regressions)
+        results["results"].update(rerun["results"])
+        regressions = compare(results, baseline)
+    assert regressions == {}
@@ -0,0 +1,88 @@
+from ctypes import c_uint8, c_uint16, c_int16
+
+import pytest
+
+from pyembc import pyembc_struct, bitfield_layout, decode_bitfields, encode_bitfields
+
+np = pytest.importorskip("numpy")
+
+
+@pyembc_struct(endian="little")
+class StatusLE:
+    header: c_uint8
+    a: (c_int16, 3)
+    b: (c_int16, 13)
+
+
+@pyembc_struct(endian="big")
+class StatusBE:
+    header: c_uint8
+    a: (c_uint16, 3)
+    b: (c_uint16, 13)
+
+
+@pyembc_struct
+class Outer:
+    status: StatusBE
+    flags_lo: (c_uint8, 4)
+    flags_hi: (c_uint8, 4)
+
+
+def test_bitfield_layout():
+    layout = bitfield_layout(StatusLE)
+    assert list(layout) == ["a", "b"]
+    assert (layout["a"].offset, layout["a"].shift, layout["a"].mask) == (2, 0, 0x7)
+    assert (layout["b"].offset, layout["b"].shift, layout["b"].mask) == (2, 3, 0x1FFF)
+    assert layout["a"].signed
+
+    layout = bitfield_layout(StatusBE)
+    assert (layout["a"].shift, layout["a"].unit_mask) == (13, 0xE000)
+    assert (layout["b"].shift, layout["b"].unit_mask) == (0, 0x1FFF)
+
+    layout = bitfield_layout(Outer)
+    assert list(layout) == ["status.a", "status.b", "flags_lo", "flags_hi"]
+    assert layout["flags_hi"].offset == 4
+
+
+@pytest.mark.parametrize("cls", [StatusLE, StatusBE])
+def test_decode_bitfields(cls):
+    values_b = [0, 1, 100, 4095] if cls is StatusBE else [0, -1, 100, -4096]
+    records = [cls(header=i, a=i, b=b) for i, b in enumerate(values_b)]
+    data = b''.join(record.stream() for record in records)
+
+    columns = decode_bitfields(cls, data)
+    assert list(columns["a"]) == [0, 1, 2, 3]
+    assert list(columns["b"]) == values_b
+    assert columns["b"].dtype == np.dtype(cls.__pyembc_fields__["b"].base_type)
+
+    assert list(decode_bitfields(cls, data, fields=["a"])) == ["a"]
+
+    with pytest.raises(ValueError):
+        decode_bitfields(cls, data[:-1])
+
+
+def test_decode_nested_bitfields():
+    records = [Outer(status=StatusBE(header=0, a=i, b=i * 3), flags_lo=i, flags_hi=15 - i) for i in range(4)]
+    columns = decode_bitfields(Outer, b''.join(record.stream() for record in records))
+    assert list(columns["status.a"]) == [0, 1, 2, 3]
+    assert list(columns["status.b"]) == [0, 3, 6, 9]
+    assert list(columns["flags_lo"]) == [0, 1, 2, 3]
+    assert list(columns["flags_hi"]) == [15, 14, 13, 12]
+
+
+@pytest.mark.parametrize("cls", [StatusLE, StatusBE])
+def test_encode_bitfields(cls):
+    data = bytearray(b''.join(cls(header=0xAA, a=0, b=0).stream() for _ in range(3)))
+    values_a = [3, 0, 2] if cls is StatusLE else [7, 0, 5]
+    result = encode_bitfields(cls, {"a": values_a, "b": np.array([1, 2, 3])}, data)
+    assert result is data
+    for i, (a, b) in enumerate(zip(values_a, [1, 2, 3])):
+        record = cls()
+        record.parse(bytes(data[i * len(record):(i + 1) * len(record)]))
+        assert (record.header, record.a, record.b) == (0xAA, a, b)
+
+    data = encode_bitfields(cls, {"a": [1, 2]})
+    assert len(data) == 2 * len(cls())
+
+    with pytest.raises(ValueError):
+        encode_bitfields(cls, {"a": [8]})
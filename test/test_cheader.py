@@ -0,0 +1,133 @@
+import os
+from ctypes import c_uint8, c_uint32, c_int16, c_float
+
+import pytest
+
+from pyembc import pyembc_struct, pyembc_union, parse_cheader, load_cheader
+
+
+@pyembc_struct
+class Inner:
+    a: c_uint8
+    b: c_int16
+
+
+@pyembc_struct
+class Outer:
+    first: Inner
+    second: c_float
+    flags_lo: (c_uint8, 3)
+    flags_hi: (c_uint8, 5)
+
+
+@pyembc_union
+class Message:
+    as_outer: Outer
+    raw: c_uint32
+
+
+def test_ccode_roundtrip():
+    classes = parse_cheader("\n".join(Message.ccode()))
+    assert set(classes) == {"Inner", "Outer", "Message"}
+    for original in (Inner, Outer, Message):
+        cls = classes[original.__name__]
+        assert len(cls()) == len(original())
+        assert cls.ccode() == original.ccode()
+
+    message = Message(as_outer=Outer(first=Inner(a=1, b=-2), second=0.5, flags_lo=3, flags_hi=17))
+    parsed = classes["Message"]()
+    parsed.parse(message.stream())
+    assert parsed.as_outer.first.b == -2
+    assert parsed.as_outer.flags_hi == 17
+
+
+def test_header_features():
+    header = """
+    #ifndef HEADER_H
+    #define HEADER_H
+    #include <stdint.h>
+
+    typedef unsigned short u16;   // basic typedef
+
+    #pragma pack(push, 1)
+    /* packed
+       frame */
+    typedef struct {
+        uint8_t id;
+        u16 length;
+        const uint32_t crc;
+    } Frame;
+    #pragma pack(pop)
+
+    struct Point {
+        signed short x;
+        short int y;
+    };
+    typedef struct Point Point_t;
+
+    typedef struct _tag_Line {
+        struct Point start;
+        Point_t end;
+        unsigned long long id;
+    } Line;
+    #endif
+    """
+    classes = parse_cheader(header)
+    assert set(classes) == {"Frame", "Point", "Point_t", "Line"}
+    assert len(classes["Frame"]()) == 7
+    assert classes["Point_t"] is classes["Point"]
+    assert len(classes["Line"]()) == 16
+    assert classes["Line"].__pyembc_fields__["id"].base_type.__name__ == "c_ulong"
+
+
+def test_endian_and_pack():
+    header = "typedef struct { unsigned char a; unsigned short b; } S;"
+    big = parse_cheader(header, endian="big", pack=1)["S"](a=1, b=2)
+    assert big.stream() == b'\x01\x00\x02'
+    little = parse_cheader(header, endian="little")["S"](a=1, b=2)
+    assert little.stream() == b'\x01\x00\x02\x00'
+
+
+def test_long_size():
+    header = "typedef struct { unsigned char a; long b; unsigned long int c; long long d; } S;"
+    lp64 = parse_cheader(header)["S"]
+    ilp32 = parse_cheader(header, long_size=4)["S"]
+    assert len(lp64()) == 28
+    assert len(ilp32()) == 20
+    assert ilp32.b.offset == 4 and ilp32.c.offset == 8 and ilp32.d.offset == 12
+    assert ilp32(a=1, b=-1, c=2 ** 32 - 1, d=-1).get("c") == 2 ** 32 - 1
+    with pytest.raises(ValueError):
+        parse_cheader(header, long_size=2)
+
+
+@pytest.mark.parametrize("header", [
+    "typedef struct { unsigned char a[4]; } S;",
+    "typedef struct { unsigned char *a; } S;",
+    "typedef struct { foo_t a; } S;",
+    "typedef struct { unsigned char a; } S",
+    "typedef struct { unsigned char a : 3; } S;",
+    "struct { unsigned char a; };",
+    "int x;",
+])
+def test_unsupported(header):
+    with pytest.raises(SyntaxError):
+        # the classes are generated on first access
+        parse_cheader(header)["S"]
+
+
+def test_cache(tmp_path):
+    header = "typedef struct { unsigned char a; } Cached;"
+    path = tmp_path / "cached.h"
+    path.write_text(header)
+    cache_dir = tmp_path / "cache"
+
+    classes = load_cheader(path, cache_dir=str(cache_dir))
+    assert load_cheader([path], cache_dir=str(cache_dir))["Cached"] is classes["Cached"]
+    assert len(os.listdir(cache_dir)) == 1
+
+    # the on-disk cache is used by a new process as well, emulated by clearing the class cache
+    from pyembc import _cheader
+    _cheader._class_cache.clear()
+    cache_file = cache_dir / os.listdir(cache_dir)[0]
+    cache_file.write_text(cache_file.read_text().replace('"Cached"', '"FromCache"'))
+    assert set(load_cheader(path, cache_dir=str(cache_dir))) == {"FromCache"}
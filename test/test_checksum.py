@@ -0,0 +1,140 @@
+import zlib
+import binascii
+from ctypes import c_uint8, c_uint16, c_uint32, c_float, c_int8, c_int16
+
+import pytest
+
+from pyembc import pyembc_struct, pyembc_union, Checksum, verify_checksums
+
+
+@pyembc_struct(endian="big", pack=1)
+class Frame:
+    id: c_uint8
+    payload: c_uint32
+    crc: Checksum(c_uint16, "crc16")
+
+
+@pyembc_struct(endian="little", pack=1)
+class Outer:
+    header: c_uint8
+    frame: Frame
+    total: Checksum(c_uint32, "crc32")
+    tail: c_uint8
+    sum: Checksum(c_uint8, "sum8", start=7)
+
+
+def test_stream_fills_checksum():
+    frame = Frame(id=1, payload=0x11223344, crc=0)
+    data = frame.stream()
+    assert data[:5] == b'\x01\x11\x22\x33\x44'
+    assert data[5:] == binascii.crc_hqx(data[:5], 0xFFFF).to_bytes(2, "big")
+    assert frame.crc == int.from_bytes(data[5:], "big")
+    assert frame.check_checksums()
+
+
+def test_parse_verifies_checksum():
+    data = Frame(id=1, payload=2, crc=0).stream()
+    frame = Frame()
+    frame.parse(data)
+    assert frame.payload == 2
+
+    corrupted = data[:1] + b'\xFF' + data[2:]
+    with pytest.raises(ValueError):
+        frame.parse(corrupted)
+    # the instance is not modified on a mismatch
+    assert frame.stream() == data
+    # shorter streams are verified with the rest of the instance
+    frame.parse(data[:3])
+    with pytest.raises(ValueError):
+        frame.parse(corrupted[:3])
+    assert frame.stream() == data
+    frame.parse(corrupted, verify=False)
+    assert not frame.check_checksums()
+    frame.update_checksums()
+    assert frame.check_checksums()
+
+
+def test_signed_checksum_field():
+    @pyembc_struct(endian="little", pack=1)
+    class Signed:
+        data: c_uint16
+        crc: Checksum(c_int16, "crc16")
+        sum: Checksum(c_int8, "sum8")
+
+    signed = Signed(data=0x1234, crc=0, sum=0)
+    data = signed.stream()
+    crc = binascii.crc_hqx(b'\x34\x12', 0xFFFF)
+    assert data[2:4] == crc.to_bytes(2, "little")
+    assert data[4] == sum(data[:4]) & 0xFF
+    assert signed.crc == int.from_bytes(data[2:4], "little", signed=True)
+    assert signed.check_checksums()
+    Signed().parse(data)
+
+
+def test_nested_checksums():
+    outer = Outer(header=9, frame=Frame(id=1, payload=2, crc=0), total=0, tail=0xAB, sum=0)
+    data = outer.stream()
+    assert data[1:8] == Frame(id=1, payload=2, crc=0).stream()
+    assert int.from_bytes(data[8:12], "little") == zlib.crc32(data[:8])
+    assert data[13] == sum(data[7:13]) & 0xFF
+
+    parsed = Outer()
+    parsed.parse(data)
+    with pytest.raises(ValueError):
+        parsed.parse(data[:2] + b'\xFF' + data[3:])
+
+
+def test_batch_verify():
+    frames = [Frame(id=i, payload=i * 1000, crc=0).stream() for i in range(4)]
+    frames[2] = frames[2][:-1] + bytes([frames[2][-1] ^ 1])
+    assert verify_checksums(Frame, b''.join(frames)) == [True, True, False, True]
+    with pytest.raises(ValueError):
+        verify_checksums(Frame, b''.join(frames)[:-1])
+
+
+def test_custom_algorithm():
+    @pyembc_struct(pack=1)
+    class S:
+        a: c_uint8
+        b: c_uint8
+        check: Checksum(c_uint8, lambda data: 0xFF - max(data))
+
+    assert S(a=3, b=7, check=0).stream() == b'\x03\x07\xF8'
+
+
+def test_invalid_checksums():
+    with pytest.raises(ValueError):
+        Checksum(c_uint8, "md5")
+
+    with pytest.raises(TypeError):
+        @pyembc_struct
+        class S:
+            a: c_uint8
+            check: Checksum(c_float, "sum8")
+
+    with pytest.raises(SyntaxError):
+        @pyembc_struct
+        class S:
+            check: Checksum(c_uint8, "sum8")
+
+    with pytest.raises(TypeError):
+        @pyembc_union
+        class U:
+            a: c_uint8
+            check: Checksum(c_uint8, "sum8")
+
+    with pytest.raises(TypeError):
+        @pyembc_union
+        class WithFrame:
+            frame: Frame
+            raw: c_uint8
+
+    @pyembc_struct(pack=1)
+    class Wrapper:
+        frame: Frame
+
+    with pytest.raises(TypeError):
+        @pyembc_union
+        class WithNestedFrame:
+            wrapper: Wrapper
+            raw: c_uint8
@@ -0,0 +1,141 @@
+import copy
+import functools
+from dataclasses import FrozenInstanceError
+from ctypes import c_uint8, c_uint16, c_uint32
+
+import pytest
+
+from pyembc import pyembc_struct, pyembc_union, Checksum, parse_records, stream_records
+
+
+@pyembc_struct
+class Padded:
+    a: c_uint8
+    b: c_uint16
+
+
+@pyembc_struct(frozen=True)
+class FrozenInner:
+    a: c_uint8
+    b: c_uint8
+
+
+@pyembc_struct(frozen=True)
+class FrozenOuter:
+    first: FrozenInner
+    second: c_uint16
+
+
+@pyembc_union(frozen=True)
+class FrozenUnion:
+    inner: FrozenInner
+    raw: c_uint16
+
+
+def test_eq():
+    padded = Padded(a=1, b=2)
+    assert padded == Padded(a=1, b=2)
+    assert padded != Padded(a=1, b=3)
+    # the padding byte is not compared
+    other = Padded()
+    other.parse(b'\x01\xFF\x02\x00')
+    assert padded == other
+    assert padded.stream() != other.stream()
+
+    @pyembc_struct
+    class Same:
+        a: c_uint8
+        b: c_uint16
+
+    assert padded != Same(a=1, b=2)
+    with pytest.raises(TypeError):
+        hash(padded)
+
+    @pyembc_struct(eq=False)
+    class Identity:
+        a: c_uint8
+
+    identity = Identity(a=1)
+    assert identity != Identity(a=1)
+
+
+def test_frozen():
+    outer = FrozenOuter(first=FrozenInner(a=1, b=2), second=3)
+    assert outer.first.b == 2
+    assert outer == FrozenOuter(FrozenInner(1, 2), 3)
+    assert len({outer, FrozenOuter(FrozenInner(1, 2), 3), FrozenOuter(FrozenInner(1, 2), 4)}) == 2
+    with pytest.raises(FrozenInstanceError):
+        outer.second = 4
+    with pytest.raises(FrozenInstanceError):
+        outer.first.a = 4
+    with pytest.raises(FrozenInstanceError):
+        outer.parse(b'\x00' * 4)
+    with pytest.raises(ValueError):
+        FrozenInner(a=256, b=0)
+
+    parsed = FrozenOuter.from_buffer_copy(outer.stream())
+    assert parsed == outer and hash(parsed) == hash(outer)
+    assert copy.deepcopy(outer) == outer
+    assert FrozenOuter.from_dict(outer.to_dict()) == outer
+    assert list(parse_records(FrozenInner, b'\x01\x02\x03\x04')) == [FrozenInner(1, 2), FrozenInner(3, 4)]
+
+    calls = []
+
+    @functools.lru_cache()
+    def decode(message):
+        calls.append(message)
+        return message.second
+
+    assert decode(outer) == decode(parsed) == 3
+    assert len(calls) == 1
+
+    with pytest.raises(TypeError):
+        @pyembc_struct(frozen=True)
+        class MutableNested:
+            inner: Padded
+
+    with pytest.raises(TypeError, match="array"):
+        @pyembc_struct(frozen=True)
+        class WithArray:
+            data: c_uint8 * 4
+
+
+def test_frozen_union():
+    u = FrozenUnion(raw=0x0201)
+    assert u.inner == FrozenInner(1, 2)
+    assert hash(u) == hash(FrozenUnion(inner=FrozenInner(1, 2)))
+    with pytest.raises(FrozenInstanceError):
+        u.raw = 0
+
+    @pyembc_union
+    class MutableUnion:
+        a: c_uint8
+        b: c_uint32
+
+    assert MutableUnion(b=5) == MutableUnion(a=5)
+    with pytest.raises(TypeError):
+        hash(MutableUnion())
+
+
+def test_frozen_checksum():
+    @pyembc_struct(pack=1, frozen=True)
+    class Frame:
+        a: c_uint8
+        crc: Checksum(c_uint8, "sum8")
+
+    frame = Frame(a=5, crc=0)
+    assert frame.crc == 5
+    assert frame.stream() == b'\x05\x05'
+    assert frame == Frame(5, 0)
+    assert Frame.from_dict({"a": 6}).crc == 6
+    with pytest.raises(FrozenInstanceError):
+        frame.update_checksums()
+
+    # stale checksums are filled in into the stream only, the instances are not modified
+    stale = Frame.from_buffer_copy(b'\x07\x00')
+    assert stale.stream() == b'\x07\x07'
+    assert stale.crc == 0
+    records = parse_records(Frame, b'\x07\x00\x08\x00', verify=False)
+    assert stream_records(Frame, records) == b'\x07\x07\x08\x08'
+    assert stream_records(Frame, list(records)) == b'\x07\x07\x08\x08'
+    assert bytes(records) == b'\x07\x00\x08\x00'
@@ -0,0 +1,186 @@
+from ctypes import c_uint8, c_uint16, c_uint32, c_int32, c_float
+
+import pytest
+
+from pyembc import pyembc_struct, pyembc_union, migrate, migrate_records, Checksum
+from pyembc import _pyembc
+from pyembc._migration import _Migration
+
+
+@pyembc_struct
+class Inner:
+    a: c_uint8
+    b: c_uint8
+
+
+@pyembc_struct(pack=1)
+class OuterV1:
+    first: Inner
+    second: c_uint8
+    third: c_uint16
+    mode: (c_uint8, 3)
+    level: (c_uint8, 5)
+    dropped: c_float
+
+
+@pyembc_struct(pack=1, evolves_from=OuterV1)
+class OuterV2:
+    first: Inner
+    second: c_uint8
+    third: c_uint16
+    added: c_uint16
+    mode: (c_uint16, 4)
+    level: (c_uint16, 12)
+
+
+@pyembc_struct(endian="big", pack=4, evolves_from=OuterV2)
+class OuterV3:
+    first: Inner
+    second: c_uint8
+    third: c_int32
+    mode: c_uint8
+    level: c_uint16
+    added: c_uint16
+
+
+def _old_records():
+    return [
+        OuterV1(first=Inner(a=i, b=i + 1), second=i + 2, third=1000 * i, mode=i % 8, level=31 - i, dropped=0.5)
+        for i in range(5)
+    ]
+
+
+def test_migration_runs():
+    migration = _Migration(OuterV1, OuterV2)
+    # first, second and third are copied with one memmove
+    assert migration.runs == [(0, 0, 5)]
+    assert [path for path, _, _ in migration.conversions] == ["mode", "level"]
+
+
+def test_migrate_instance():
+    old = _old_records()[3]
+    new = OuterV2.migrate(old)
+    assert isinstance(new, OuterV2)
+    assert (new.first.a, new.first.b, new.second, new.third) == (3, 4, 5, 3000)
+    assert (new.mode, new.level, new.added) == (3, 28, 0)
+
+    newest = migrate(old, OuterV3)
+    assert isinstance(newest, OuterV3)
+    assert (newest.first.b, newest.second, newest.third, newest.mode, newest.level) == (4, 5, 3000, 3, 28)
+    assert OuterV3.migrate(new).stream() == newest.stream()
+
+    with pytest.raises(TypeError):
+        _Migration(OuterV1, OuterV2).convert(Inner())
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_migrate_records(use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(_pyembc, "_np", None)
+    old_records = _old_records()
+    data = migrate_records(OuterV1, OuterV3, b''.join(record.stream() for record in old_records))
+    size = len(OuterV3())
+    assert len(data) == size * len(old_records)
+    for i, old in enumerate(old_records):
+        assert data[i * size:(i + 1) * size] == migrate(old, OuterV3).stream()
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_migrate_records_overflow(use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(_pyembc, "_np", None)
+
+    @pyembc_struct
+    class Wide:
+        a: c_uint32
+
+    @pyembc_struct
+    class Narrow:
+        a: c_uint16
+
+    assert migrate_records(Wide, Narrow, Wide(a=5).stream() + Wide(a=6).stream()) == b'\x05\x00\x06\x00'
+    with pytest.raises(ValueError):
+        migrate_records(Wide, Narrow, Wide(a=0x10000).stream())
+
+
+def test_migrate_checksums():
+    @pyembc_struct(pack=1)
+    class V1:
+        a: c_uint8
+        crc: Checksum(c_uint16, "crc16")
+
+    @pyembc_struct(pack=1, evolves_from=V1)
+    class V2:
+        a: c_uint16
+        crc: Checksum(c_uint16, "crc16")
+
+    data = migrate_records(V1, V2, V1(a=1, crc=0).stream())
+    assert data == V2(a=1, crc=0).stream()
+
+
+def test_migrate_unions():
+    @pyembc_union
+    class UV1:
+        as_inner: Inner
+        raw: c_uint16
+
+    @pyembc_union
+    class UV1Copy:
+        as_inner: Inner
+        raw: c_uint16
+
+    @pyembc_union
+    class UV2:
+        as_inner: Inner
+        raw: c_uint32
+
+    @pyembc_struct
+    class WithUnion:
+        u: UV1
+
+    @pyembc_struct(evolves_from=WithUnion)
+    class WithUnionCopy:
+        u: UV1Copy
+
+    @pyembc_struct(evolves_from=WithUnion)
+    class WithUnionV2:
+        u: UV2
+
+    assert migrate(UV1(raw=0x0201), UV1Copy).as_inner.b == 2
+    assert WithUnionCopy.migrate(WithUnion(u=UV1(raw=0x0201))).u.raw == 0x0201
+    with pytest.raises(TypeError):
+        WithUnionV2.migrate(WithUnion())
+    with pytest.raises(TypeError):
+        migrate(UV1(), UV2)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_migrate_float_to_int(use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(_pyembc, "_np", None)
+
+    @pyembc_struct(pack=1)
+    class A1:
+        x: c_float
+        y: c_float
+
+    @pyembc_struct(pack=1, evolves_from=A1)
+    class A2:
+        x: c_uint16
+        y: (c_uint8, 4)
+        z: (c_uint8, 4)
+
+    data = A1(x=1.0, y=3.0).stream() + A1(x=65535.0, y=15.0).stream()
+    assert migrate_records(A1, A2, data) == A2(x=1, y=3, z=0).stream() + A2(x=65535, y=15, z=0).stream()
+    assert A2.migrate(A1(x=2.0, y=1.0)).x == 2
+    for x, y in [(1.5, 0.0), (-3.0, 0.0), (65536.0, 0.0), (float("nan"), 0.0), (float("inf"), 0.0), (0.0, 16.0)]:
+        with pytest.raises(ValueError):
+            migrate_records(A1, A2, A1(x=1.0, y=1.0).stream() + A1(x=x, y=y).stream())
+        with pytest.raises(ValueError):
+            A2.migrate(A1(x=x, y=y))
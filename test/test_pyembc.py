@@ -1,55 +1,12 @@
-import time
+import gc
+import copy
+import ctypes
+import weakref
 from ctypes import c_ubyte, c_uint16, c_uint8, c_uint32, c_float, c_int8
 
-import construct
 import pytest
 
-from pyembc.pyembc import pyembc_struct, pyembc_union
-
-
-def test_compare_construct_benchmark():
-    NA = construct.Struct(
-        "send_mode" / construct.Struct(
-            "a" / construct.Int8ub,
-            "b" / construct.Int8ub
-        ),
-        "enable" / construct.Int8ub
-    )
-
-    @pyembc_struct
-    class SendMode:
-        a: c_ubyte
-        b: c_ubyte
-
-    @pyembc_struct
-    class NA2:
-        send_mode: SendMode
-        enable: c_ubyte
-
-    data = b'\x01\x02\x03\x04'
-    N = 10000
-
-    print(' ')
-    t0 = time.perf_counter()
-    for i in range(N):
-        na = NA.parse(data)
-        newdata = NA.build(na)
-        # del na
-    t1 = time.perf_counter()
-    print('construct:', t1 - t0)
-    a = t1-t0
-
-    t0 = time.perf_counter()
-    na2 = NA2()
-    for i in range(N):
-        na2.parse(data)
-        newdata = na2.stream()
-        # del na2
-    t1 = time.perf_counter()
-    print('pyembc:   ', t1 - t0)
-    b = t1 - t0
-
-    print('Diff factor:', max(a, b) / min(a, b))
+from pyembc import pyembc_struct, pyembc_union, _pyembc
 
 
 @pyembc_struct(endian="little")
@@ -132,7 +89,7 @@ def test_parse_union():
     assert u.sl.c == 0x21
 
 
-def parse_embedded():
+def test_parse_embedded():
     @pyembc_struct
     class Inner:
         a: c_uint8
@@ -235,3 +192,206 @@ def test_bitfields_endian():
     assert bf_be.a == 0b101
     assert bf_be.b == 0b10101
     assert bf_be.c == 0x42
+
+
+def test_dict_conversion():
+    @pyembc_struct
+    class Inner:
+        a: c_uint8
+        b: (c_uint8, 4)
+        c: (c_uint8, 4)
+
+    @pyembc_struct
+    class Outer:
+        first: Inner
+        second: c_float
+
+    outer = Outer(first=Inner(a=1, b=2, c=3), second=0.5)
+    d = outer.to_dict()
+    assert d == {"first": {"a": 1, "b": 2, "c": 3}, "second": 0.5}
+    assert Outer.from_dict(d).stream() == outer.stream()
+
+    partial = Outer.from_dict({"first": {"a": 7}})
+    assert partial.first.a == 7
+    assert partial.first.b == 0
+    assert partial.second == 0
+
+    with pytest.raises(TypeError):
+        Outer.from_dict({"third": 1})
+    with pytest.raises(ValueError):
+        Outer.from_dict({"first": {"b": 16}})
+
+    u = U.from_dict({"raw": 0x04030201})
+    assert u.to_dict() == {"sl": {"a": 0x0201, "b": 3, "c": 4}, "raw": 0x04030201}
+
+
+def test_dict_conversion_arrays():
+    @pyembc_struct
+    class Point:
+        x: c_int8
+
+    @pyembc_struct
+    class WithArrays:
+        data: c_uint8 * 4
+        matrix: (c_int8 * 2) * 3
+        points: Point * 2
+
+    with_arrays = WithArrays.from_dict({"data": [1, 2, 3, 4], "matrix": [[0, 1], [2, 3], [4, -5]]})
+    with_arrays.points[1].x = -1
+    d = with_arrays.to_dict()
+    assert d == {
+        "data": [1, 2, 3, 4], "matrix": [[0, 1], [2, 3], [4, -5]], "points": [{"x": 0}, {"x": -1}]
+    }
+    # the values are copies, not views into the instance
+    with_arrays.data[0] = 9
+    assert d["data"][0] == 1
+    assert WithArrays.from_dict(d).to_dict() == d
+
+    with pytest.raises(ValueError):
+        WithArrays.from_dict({"data": [1, 2, 3]})
+    with pytest.raises(ValueError):
+        WithArrays.from_dict({"data": [1, 2, 3, 256]})
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_to_columns(use_numpy, monkeypatch):
+    np = pytest.importorskip("numpy") if use_numpy else None
+    if not use_numpy:
+        monkeypatch.setattr(_pyembc, "_np", None)
+
+    @pyembc_struct
+    class Inner:
+        a: c_uint8
+        b: c_uint16
+
+    @pyembc_struct
+    class Outer:
+        first: Inner
+        second: c_float
+
+    records = [Outer(first=Inner(a=i, b=i * 2), second=i / 2) for i in range(5)]
+    columns = Outer.to_columns(records)
+    assert list(columns) == ["first.a", "first.b", "second"]
+    assert list(columns["first.a"]) == [0, 1, 2, 3, 4]
+    assert list(columns["first.b"]) == [0, 2, 4, 6, 8]
+    assert list(columns["second"]) == [0.0, 0.5, 1.0, 1.5, 2.0]
+    if use_numpy:
+        assert columns["first.b"].dtype == np.uint16
+    else:
+        assert columns["first.b"].typecode == "H"
+
+    @pyembc_struct
+    class WithArray:
+        data: c_uint8 * 4
+        matrix: (c_int8 * 2) * 3
+
+    records = [WithArray.from_dict({"data": [i, i + 1, i + 2, i + 3]}) for i in range(2)]
+    if use_numpy:
+        columns = WithArray.to_columns(records)
+        assert columns["data"].shape == (2, 4)
+        assert columns["data"].tolist() == [[0, 1, 2, 3], [1, 2, 3, 4]]
+        assert columns["matrix"].shape == (2, 3, 2)
+        assert WithArray.to_columns([])["data"].shape == (0, 4)
+    else:
+        with pytest.raises(TypeError):
+            WithArray.to_columns(records)
+
+
+def test_nested_views():
+    @pyembc_struct
+    class Inner:
+        a: c_uint8
+        b: c_uint8
+
+    @pyembc_struct
+    class Outer:
+        first: Inner
+        second: c_uint8
+
+    outer = Outer(first=Inner(a=1, b=2), second=3)
+    first = outer.first
+    outer.parse(b'\x11\x22\x33')
+    assert first.a == 0x11
+    outer.first = Inner(a=5, b=6)
+    assert first.b == 6
+    first.a = 7
+    assert outer.stream() == b'\x07\x06\x33'
+    assert isinstance(Outer.first.offset, int)
+
+    other = copy.copy(outer)
+    other.first.a = 8
+    assert outer.first.a == 7
+    assert other.stream() == b'\x08\x06\x33'
+
+    # the views do not make reference cycles, so the instances are freed without the cycle collector
+    gc.disable()
+    try:
+        ref = weakref.ref(outer)
+        outer.first.a
+        del outer, other, first
+        assert ref() is None
+    finally:
+        gc.enable()
+
+    u = U()
+    u.parse(b'\x01\x02\x03\x04')
+    assert u.sl.c == 4
+
+
+def test_get_path():
+    @pyembc_struct(endian="big")
+    class Inner:
+        a: c_uint16
+        b: (c_int8, 3)
+        c: (c_int8, 5)
+
+    @pyembc_struct(endian="little")
+    class Outer:
+        x: c_uint8
+        first: Inner
+        second: c_float
+
+    outer = Outer(x=1, first=Inner(a=0x1234, b=-3, c=9), second=1.5)
+    assert outer.get("x") == 1
+    assert outer.get("first.a") == 0x1234
+    assert outer.get("first.b") == -3
+    assert outer.get("first.c") == 9
+    assert outer.get("second") == 1.5
+    assert outer.get("first") == outer.first
+    outer.parse(outer.stream()[:2] + b'\x56\x78' + outer.stream()[4:])
+    assert outer.get("first.a") == 0x5678
+
+    assert U(sl=SL(a=0xFFAA, b=1, c=2)).get("sl.b") == 1
+
+    with pytest.raises(AttributeError):
+        outer.get("first.d")
+    with pytest.raises(AttributeError):
+        outer.get("x.a")
+
+
+def test_union_methods():
+    class Plain(ctypes.Union):
+        _fields_ = [("a", c_uint8)]
+
+    # the generated unions get their own special methods, other ctypes unions are not affected
+    with pytest.raises(TypeError):
+        len(Plain())
+    assert repr(Plain()).startswith("<")
+
+    u = U(raw=0x04030201)
+    assert repr(u) == "U(sl=SL(a:u16=0x201, b:u8=0x3, c:u8=0x4), raw:u32=0x4030201)"
+    with pytest.raises(ValueError):
+        u.raw = -1
+    with pytest.raises(TypeError):
+        u.sl = SB()
+    with pytest.raises(TypeError):
+        U(other=1)
+    # the members are views into the union
+    sl = u.sl
+    u.raw = 0x08070605
+    assert sl.a == 0x605
+
+
+def test_parse_too_long():
+    with pytest.raises(ValueError):
+        SL().parse(b'\x01\x02\x03\x04\x05')
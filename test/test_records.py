@@ -0,0 +1,69 @@
+import ctypes
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import c_uint8, c_uint16
+
+import pytest
+
+from pyembc import pyembc_struct, parse_records, stream_records, Checksum
+
+
+@pyembc_struct(endian="big", pack=1)
+class Inner:
+    a: c_uint8
+    b: c_uint16
+
+
+@pyembc_struct(endian="big", pack=1)
+class Record:
+    first: Inner
+    crc: Checksum(c_uint16, "crc16")
+
+
+def _data(count):
+    return bytes(stream_records(Record, [Record(first=Inner(a=i % 256, b=1000 + i), crc=0) for i in range(count)]))
+
+
+@pytest.mark.parametrize("kind", [bytes, bytearray, lambda data: memoryview(data)[:]])
+def test_parse_records(kind):
+    data = _data(10)
+    records = parse_records(Record, kind(data))
+    assert isinstance(records, ctypes.Array)
+    assert len(records) == 10
+    assert [(record.first.a, record.first.b) for record in records] == [(i, 1000 + i) for i in range(10)]
+    assert records[3].stream() == data[3 * 5:4 * 5]
+    assert len(parse_records(Record, b'')) == 0
+
+    with pytest.raises(ValueError):
+        parse_records(Record, data[:-1])
+    corrupted = bytearray(data)
+    corrupted[7] ^= 0xFF
+    with pytest.raises(ValueError, match="record 1"):
+        parse_records(Record, corrupted)
+    assert parse_records(Record, corrupted, verify=False)[1].first.b == 1001 ^ 0xFF
+
+
+def test_stream_records():
+    data = _data(4)
+    records = parse_records(Record, data)
+    records[2].first.a = 42
+    streamed = stream_records(Record, records)
+    assert isinstance(streamed, bytearray)
+    # the checksum is updated for the modified record
+    assert bytes(streamed) == data[:10] + Record(first=Inner(a=42, b=1002), crc=0).stream() + data[15:]
+
+    out = bytearray(30)
+    assert stream_records(Record, list(records), out=out) is out
+    assert out[:20] == streamed and out[20:] == bytes(10)
+    with pytest.raises(ValueError):
+        stream_records(Record, records, out=bytearray(5))
+    with pytest.raises(TypeError):
+        stream_records(Record, [Inner()])
+    with pytest.raises(TypeError):
+        stream_records(Inner, records)
+
+
+def test_records_threads():
+    chunks = [_data(1000) for _ in range(8)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda chunk: bytes(stream_records(Record, parse_records(Record, chunk))), chunks))
+    assert results == chunks
@@ -0,0 +1,123 @@
+import gc
+import weakref
+from ctypes import c_uint8, c_uint16
+
+import pytest
+
+import pyembc
+from pyembc import pyembc_struct
+
+
+@pyembc_struct
+class Before:
+    a: c_uint16
+    b: c_uint8
+
+
+BEFORE = f"{__name__}.Before"
+
+
+def test_stats():
+    original_parse = Before.parse
+    pyembc.reset_stats()
+    pyembc.enable_stats()
+    try:
+        @pyembc_struct
+        class After:
+            a: c_uint8
+
+        before = Before()
+        before.parse(b'\x01\x02\x03\x04')
+        before.parse(b'\x01\x02\x03\x04')
+        before.stream()
+        before.a = 5
+        After(a=1).stream()
+
+        snapshot = pyembc.stats()
+        assert snapshot[BEFORE]["parse"]["calls"] == 2
+        assert snapshot[BEFORE]["parse"]["bytes"] == 8
+        assert snapshot[BEFORE]["parse"]["time"] > 0
+        assert snapshot[BEFORE]["stream"] == {"calls": 1, "bytes": 4, "time": snapshot[BEFORE]["stream"]["time"]}
+        assert snapshot[BEFORE]["__setattr__"]["calls"] == 1
+        assert snapshot[f"{__name__}.test_stats.<locals>.After"]["stream"]["calls"] == 1
+        assert snapshot[f"{__name__}.test_stats.<locals>.After"]["__setattr__"]["calls"] == 1
+    finally:
+        pyembc.disable_stats()
+
+    assert Before.parse is original_parse
+    before.parse(b'\x01\x02\x03\x04')
+
+    exported = []
+    pyembc.export_stats(exported.append, reset=True)
+    assert exported[0][BEFORE]["parse"]["calls"] == 2
+    assert pyembc.stats() == {}
+
+
+def test_stats_invalid_parse_and_lifetime():
+    pyembc.reset_stats()
+    pyembc.enable_stats()
+    try:
+        with pytest.raises(TypeError, match="bytes required"):
+            Before().parse(5)
+        assert pyembc.stats()[BEFORE]["parse"] == {
+            "calls": 1, "bytes": 0, "time": pyembc.stats()[BEFORE]["parse"]["time"]
+        }
+
+        @pyembc_struct
+        class Temporary:
+            a: c_uint8
+
+        Temporary(a=1).stream()
+        ref = weakref.ref(Temporary)
+        del Temporary
+        gc.collect()
+        # the statistics do not keep the classes alive
+        assert ref() is None
+        assert pyembc.stats()[f"{__name__}.test_stats_invalid_parse_and_lifetime.<locals>.Temporary"]["stream"]["calls"] == 1
+    finally:
+        pyembc.disable_stats()
+        pyembc.reset_stats()
+
+
+def test_stats_same_class_name():
+    def make():
+        @pyembc_struct
+        class Before:
+            a: c_uint8
+        return Before
+
+    pyembc.reset_stats()
+    pyembc.enable_stats()
+    try:
+        make()(a=1).stream()
+        Before().stream()
+        snapshot = pyembc.stats()
+        # classes of the same name in different scopes are not merged
+        assert snapshot[BEFORE]["stream"]["calls"] == 1
+        assert snapshot[BEFORE]["stream"]["bytes"] == 4
+        local = snapshot[f"{__name__}.test_stats_same_class_name.<locals>.make.<locals>.Before"]
+        assert local["stream"]["calls"] == 1
+        assert local["stream"]["bytes"] == 1
+    finally:
+        pyembc.disable_stats()
+        pyembc.reset_stats()
+
+
+def test_stats_records():
+    data = bytes(range(12))
+    pyembc.reset_stats()
+    pyembc.enable_stats()
+    try:
+        records = pyembc.parse_records(Before, data)
+        pyembc.stream_records(Before, records)
+        pyembc.stream_records(Before, iter(records))
+        snapshot = pyembc.stats()[BEFORE]
+        assert snapshot["parse_records"]["calls"] == 1
+        assert snapshot["parse_records"]["bytes"] == 12
+        assert snapshot["stream_records"]["calls"] == 2
+        assert snapshot["stream_records"]["bytes"] == 24
+    finally:
+        pyembc.disable_stats()
+    pyembc.parse_records(Before, data)
+    assert pyembc.stats()[BEFORE]["parse_records"]["calls"] == 1
+    pyembc.reset_stats()